@@ -1,7 +1,25 @@
+import os
+import logging
 from flask import Flask
 
-def create_app():
+def create_app(url_prefix='', enable_cors=False, download_disposition='attachment'):
+    """
+    Fábrica única de la aplicación, usada por run.py (rutas en la raíz) y por
+    api/index.py (rutas bajo /api con CORS y descargas inline).
+    El estado costoso (plantilla precargada, caché de imágenes, sesión HTTP)
+    es compartido por proceso; ver app.state.warm_up.
+    """
+    # Los logs de depuración (payloads, celdas) están apagados por defecto;
+    # LOG_LEVEL=DEBUG los activa
+    if os.environ.get('LOG_LEVEL'):
+        logging.basicConfig(level=os.environ['LOG_LEVEL'].upper())
+
     app = Flask(__name__)
+    app.config['DOWNLOAD_DISPOSITION'] = download_disposition
+    if enable_cors:
+        from flask_cors import CORS
+        # Habilitar CORS para todas las rutas
+        CORS(app)
     from .routes import main
-    app.register_blueprint(main)
-    return app
\ No newline at end of file
+    app.register_blueprint(main, url_prefix=url_prefix or None)
+    return app
@@ -0,0 +1,432 @@
+import os
+import time
+import tempfile
+import threading
+import contextvars
+from .utils import env_int, env_float
+
+try:
+    import fcntl
+except ImportError:
+    # Sin flock (Windows): los cupos son por proceso
+    fcntl = None
+
+# Contadores compartidos (índices de AdmissionController._counters)
+_ADMITTED, _REJECTED = range(2)
+
+# Cada cuánto se reintenta tomar un cupo mientras se espera
+_POLL_SECONDS = 0.05
+
+
+class AdmissionRejected(Exception):
+    """No hay cupo para procesar imágenes (el nodo está saturado); se responde 429"""
+
+
+class LimitExceeded(Exception):
+    """
+    La petición supera uno de sus límites de recursos. status es el código
+    HTTP de la respuesta: 413 para cantidad, bytes y píxeles; 503 para el
+    tiempo máximo.
+    """
+
+    def __init__(self, message, status=413):
+        self.status = status
+        super().__init__(message)
+
+
+class AdmissionLimits:
+    """
+    Límites por petición (0 desactiva cada uno):
+
+    - max_images: cantidad de imágenes (ADMISSION_MAX_IMAGES)
+    - max_bytes: bytes descargados en total (ADMISSION_MAX_BYTES)
+    - max_pixels: píxeles de todas las imágenes, según sus cabeceras
+      (ADMISSION_MAX_PIXELS)
+    - max_seconds: tiempo desde que la petición obtiene su cupo
+      (ADMISSION_MAX_SECONDS). Por defecto 20 s: sumados a los 5 s de
+      espera de ADMISSION_QUEUE_TIMEOUT quedan por debajo del timeout de
+      30 s de los workers de gunicorn, así la petición responde 503 antes
+      de que el maestro mate al worker.
+    - job_max_seconds: lo mismo para los trabajos de la cola, que no corren
+      dentro de una petición (ADMISSION_JOB_MAX_SECONDS)
+    """
+
+    def __init__(self, max_images, max_bytes, max_pixels, max_seconds, job_max_seconds):
+        self.max_images = max_images
+        self.max_bytes = max_bytes
+        self.max_pixels = max_pixels
+        self.max_seconds = max_seconds
+        self.job_max_seconds = job_max_seconds
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            max_images=env_int('ADMISSION_MAX_IMAGES', 100),
+            max_bytes=env_int('ADMISSION_MAX_BYTES', 256 * 1024 * 1024),
+            max_pixels=env_int('ADMISSION_MAX_PIXELS', 1_500_000_000),
+            max_seconds=env_float('ADMISSION_MAX_SECONDS', 20),
+            job_max_seconds=env_float('ADMISSION_JOB_MAX_SECONDS', 600),
+        )
+
+    def as_dict(self):
+        return {'max_images': self.max_images, 'max_bytes': self.max_bytes,
+                'max_pixels': self.max_pixels, 'max_seconds': self.max_seconds,
+                'job_max_seconds': self.job_max_seconds}
+
+
+class RequestBudget:
+    """
+    Consumo de una petición admitida. Lo cargan la descarga (bytes), la
+    llegada de cada imagen (píxeles) y los puntos de control del pipeline
+    (tiempo), también desde los hilos de los pools (ver metrics.submit).
+    """
+
+    def __init__(self, limits, max_seconds):
+        self.limits = limits
+        self.max_seconds = max_seconds
+        self.deadline = time.monotonic() + max_seconds if max_seconds else None
+        self.bytes = 0
+        self.pixels = 0
+        self._lock = threading.Lock()
+
+    def charge_bytes(self, count):
+        with self._lock:
+            self.bytes += count
+            total = self.bytes
+        if self.limits.max_bytes and total > self.limits.max_bytes:
+            raise LimitExceeded(f"Las imágenes superan el máximo de {self.limits.max_bytes} bytes descargados")
+        self.check_deadline()
+
+    def charge_pixels(self, count):
+        with self._lock:
+            self.pixels += count
+            total = self.pixels
+        if self.limits.max_pixels and total > self.limits.max_pixels:
+            raise LimitExceeded(f"Las imágenes superan el máximo de {self.limits.max_pixels} píxeles")
+        self.check_deadline()
+
+    def time_left(self):
+        if self.deadline is None:
+            return float('inf')
+        return self.deadline - time.monotonic()
+
+    def check_deadline(self):
+        if self.time_left() < 0:
+            raise LimitExceeded(f"La petición superó el tiempo máximo de {self.max_seconds:g}s",
+                                status=503)
+
+
+_budget = contextvars.ContextVar('request_budget', default=None)
+
+
+def charge_bytes(count):
+    """Carga bytes descargados a la petición en curso (no hace nada fuera de una admisión)"""
+    budget = _budget.get()
+    if budget is not None:
+        budget.charge_bytes(count)
+
+
+def charge_pixels(count):
+    """Carga los píxeles de una imagen a la petición en curso"""
+    budget = _budget.get()
+    if budget is not None:
+        budget.charge_pixels(count)
+
+
+def check_deadline():
+    """Lanza LimitExceeded si la petición en curso superó su tiempo máximo"""
+    budget = _budget.get()
+    if budget is not None:
+        budget.check_deadline()
+
+
+def time_left():
+    """Segundos que le quedan a la petición en curso (infinito fuera de una admisión)"""
+    budget = _budget.get()
+    return budget.time_left() if budget is not None else float('inf')
+
+
+class Admission:
+    """
+    Cupo de procesamiento de una petición, usado como contexto:
+
+        with controller.admit(len(image_urls)):
+            pdf = generate_invoice_pdf_from_urls(image_urls)
+
+    Al entrar espera un cupo y activa el presupuesto de la petición; al
+    salir lo libera.
+    """
+    __slots__ = ('controller', 'image_count', 'timeout', 'max_seconds', 'slot', 'budget', 'token')
+
+    def __init__(self, controller, image_count, timeout, max_seconds):
+        self.controller = controller
+        self.image_count = image_count
+        self.timeout = timeout
+        self.max_seconds = max_seconds
+
+    def __enter__(self):
+        self.controller.check_count(self.image_count)
+        self.slot = self.controller._acquire(self.timeout)
+        self.budget = RequestBudget(self.controller.limits, self.max_seconds)
+        self.token = _budget.set(self.budget)
+        return self.budget
+
+    def __exit__(self, *exc):
+        _budget.reset(self.token)
+        self.controller._release(self.slot)
+        return False
+
+
+class _FileSlots:
+    """
+    count cupos compartidos por todos los procesos del nodo: un archivo por
+    cupo en directory, tomado con flock. El kernel suelta el bloqueo cuando
+    muere el proceso que lo tiene (SIGKILL, OOM), así un worker caído no se
+    lleva su cupo.
+
+    Quien toma un cupo escribe su pid en el archivo y lo vacía al soltarlo;
+    las estadísticas (in_use) leen esos pids sin tocar los bloqueos.
+    """
+
+    def __init__(self, directory, prefix, count):
+        os.makedirs(directory, exist_ok=True)
+        self.paths = [os.path.join(directory, f"{prefix}-{i}.lock") for i in range(count)]
+
+    def _lock(self, path):
+        fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_CLOEXEC, 0o666)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return None
+        except BaseException:
+            os.close(fd)
+            raise
+        return fd
+
+    def try_acquire(self):
+        """Descriptor del cupo tomado, o None si todos están ocupados"""
+        for path in self.paths:
+            fd = self._lock(path)
+            if fd is not None:
+                os.ftruncate(fd, 0)
+                os.pwrite(fd, str(os.getpid()).encode(), 0)
+                return fd
+        return None
+
+    def acquire(self, timeout):
+        """Espera un cupo hasta timeout segundos (None: sin límite); None si no se libera ninguno"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            fd = self.try_acquire()
+            if fd is not None:
+                return fd
+            wait = _POLL_SECONDS if deadline is None else min(_POLL_SECONDS, deadline - time.monotonic())
+            if wait <= 0:
+                return None
+            time.sleep(wait)
+
+    @staticmethod
+    def release(fd):
+        # LOCK_UN explícito: un hijo creado con fork mientras se tenía el cupo
+        # (IMAGE_POOL=process) hereda el descriptor, y cerrarlo no bastaría
+        os.ftruncate(fd, 0)
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+
+    def in_use(self):
+        """
+        Cupos ocupados según los pids escritos en los archivos, sin tomar
+        ningún bloqueo (una consulta no demora ni rechaza peticiones). Es
+        aproximado: el pid de un worker muerto no cuenta, pero un cupo recién
+        tomado puede no verse todavía.
+        """
+        busy = 0
+        for path in self.paths:
+            try:
+                with open(path, 'rb') as f:
+                    pid = int(f.read() or 0)
+            except (OSError, ValueError):
+                continue
+            if pid and _alive(pid):
+                busy += 1
+        return busy
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class _LocalSlots:
+    """Cupos por proceso, con la misma interfaz que _FileSlots (sin flock)"""
+
+    def __init__(self, count):
+        self._semaphore = threading.BoundedSemaphore(count)
+        self._lock = threading.Lock()
+        self._in_use = 0
+
+    def _taken(self):
+        with self._lock:
+            self._in_use += 1
+        return True
+
+    def try_acquire(self):
+        return self._taken() if self._semaphore.acquire(False) else None
+
+    def acquire(self, timeout):
+        return self._taken() if self._semaphore.acquire(True, timeout) else None
+
+    def release(self, slot):
+        with self._lock:
+            self._in_use -= 1
+        self._semaphore.release()
+
+    def in_use(self):
+        with self._lock:
+            return self._in_use
+
+
+class AdmissionController:
+    """
+    Control de admisión de las peticiones con muchas imágenes.
+
+    Los cupos de procesamiento simultáneos (slots) son archivos bloqueados
+    con flock en directory (ver _FileSlots), compartidos por todos los
+    workers de gunicorn: el límite es del nodo y el cupo de un worker que
+    muere se libera solo. Sin flock (o sin directorio) son por proceso. Una
+    petición espera su cupo hasta queue_timeout segundos (None: sin límite,
+    para la cola de trabajos) y se rechaza con AdmissionRejected si no lo
+    obtiene o si ya hay max_queued esperando (también contados con flock).
+    Ya admitida, se le aplican los límites de AdmissionLimits.
+    """
+
+    def __init__(self, slots, max_queued, queue_timeout, limits, directory=None):
+        self.slots = slots
+        self.max_queued = max_queued
+        self.queue_timeout = queue_timeout
+        self.limits = limits
+        self.directory = directory
+        self.shared = False
+        if fcntl is not None and directory:
+            try:
+                self._slots = _FileSlots(directory, 'slot', slots)
+                self._queue = _FileSlots(directory, 'queue', max_queued) if max_queued else None
+                self.shared = True
+            except OSError:
+                # Directorio no escribible (algunos entornos serverless)
+                pass
+        if not self.shared:
+            self._slots = _LocalSlots(slots)
+            self._queue = _LocalSlots(max_queued) if max_queued else None
+        try:
+            import multiprocessing
+            # Solo totales acumulados: si un worker muere no quedan desfasados
+            self._counters = multiprocessing.Array('q', 2)
+        except (ImportError, OSError):
+            # Sin memoria compartida (algunos entornos serverless)
+            self._counters = _LocalCounters(2)
+
+    def admit(self, image_count, timeout=False, max_seconds=False):
+        """
+        Contexto (Admission) que obtiene un cupo para procesar image_count
+        imágenes. timeout=False usa queue_timeout; None espera sin límite.
+        max_seconds=False usa limits.max_seconds.
+        """
+        return Admission(self, image_count, self.queue_timeout if timeout is False else timeout,
+                         self.limits.max_seconds if max_seconds is False else max_seconds)
+
+    def check_count(self, image_count):
+        """Lanza LimitExceeded si image_count supera max_images"""
+        if self.limits.max_images and image_count > self.limits.max_images:
+            raise LimitExceeded(f"Se permiten como máximo {self.limits.max_images} imágenes por petición "
+                                f"(se recibieron {image_count})")
+
+    def _add(self, index, delta):
+        with self._counters.get_lock():
+            self._counters[index] += delta
+
+    def _acquire(self, timeout):
+        """Toma un cupo y lo retorna (para Admission); lanza AdmissionRejected si no lo obtiene"""
+        slot = self._slots.try_acquire()
+        if slot is None:
+            # Las peticiones con tiempo de espera hacen fila en max_queued
+            # puestos; la cola de trabajos (timeout None) ya está acotada
+            ticket = None
+            if timeout is not None and self._queue is not None:
+                ticket = self._queue.try_acquire()
+                if ticket is None:
+                    self._add(_REJECTED, 1)
+                    raise AdmissionRejected(f"Hay {self.max_queued} peticiones esperando cupo; intente más tarde")
+            try:
+                slot = self._slots.acquire(timeout)
+            finally:
+                if ticket is not None:
+                    self._queue.release(ticket)
+            if slot is None:
+                self._add(_REJECTED, 1)
+                raise AdmissionRejected(f"Sin cupo para procesar imágenes después de {timeout:g}s; "
+                                        "intente más tarde")
+        self._add(_ADMITTED, 1)
+        return slot
+
+    def _release(self, slot):
+        self._slots.release(slot)
+
+    def stats(self):
+        with self._counters.get_lock():
+            counters = list(self._counters)
+        return {
+            'slots': self.slots,
+            'in_use': self._slots.in_use(),
+            'waiting': self._queue.in_use() if self._queue is not None else None,
+            'admitted': counters[_ADMITTED],
+            'rejected': counters[_REJECTED],
+            'max_queued': self.max_queued,
+            'queue_timeout': self.queue_timeout,
+            'shared': self.shared,
+            'limits': self.limits.as_dict(),
+        }
+
+
+class _LocalCounters(list):
+    """Contadores por proceso con la misma interfaz que multiprocessing.Array"""
+
+    def __init__(self, size):
+        super().__init__([0] * size)
+        self._lock = threading.Lock()
+
+    def get_lock(self):
+        return self._lock
+
+
+_controller = None
+_controller_lock = threading.Lock()
+
+
+def get_admission_controller():
+    """
+    Controlador (único por proceso; los cupos son del nodo, ver
+    AdmissionController). Configuración: ADMISSION_SLOTS (por defecto la
+    mitad de las CPUs), ADMISSION_MAX_QUEUED, ADMISSION_QUEUE_TIMEOUT,
+    ADMISSION_SLOTS_DIR (directorio de los archivos de cupos; vacío los
+    hace por proceso) y los límites de AdmissionLimits.
+    """
+    global _controller
+    if _controller is None:
+        with _controller_lock:
+            if _controller is None:
+                _controller = AdmissionController(
+                    slots=max(1, env_int('ADMISSION_SLOTS', max(1, (os.cpu_count() or 2) // 2))),
+                    max_queued=env_int('ADMISSION_MAX_QUEUED', 16),
+                    queue_timeout=env_float('ADMISSION_QUEUE_TIMEOUT', 5),
+                    limits=AdmissionLimits.from_env(),
+                    directory=os.environ.get('ADMISSION_SLOTS_DIR',
+                                             os.path.join(tempfile.gettempdir(), 'fill_invoice_admission')),
+                )
+    return _controller
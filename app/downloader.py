@@ -0,0 +1,125 @@
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from .metrics import stage, submit
+from .admission import charge_bytes, check_deadline, time_left
+from .utils import env_int, env_float
+
+
+class DownloadError(Exception):
+    """Error al descargar una imagen; el mensaje incluye la URL que falló"""
+
+    def __init__(self, url, reason):
+        self.url = url
+        super().__init__(f"Error al descargar imagen desde {url}: {reason}")
+
+
+_session = None
+_executor = None
+_lock = threading.Lock()
+
+
+def get_session():
+    """
+    Sesión HTTP (única por proceso) con pool de conexiones y reintentos con
+    backoff exponencial para errores de conexión y respuestas 429/5xx.
+    """
+    global _session
+    if _session is None:
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+
+        with _lock:
+            if _session is None:
+                retry = Retry(
+                    total=env_int('DOWNLOAD_RETRIES', 2),
+                    backoff_factor=env_float('DOWNLOAD_BACKOFF', 0.3),
+                    status_forcelist=(429, 500, 502, 503, 504),
+                    allowed_methods=frozenset(['GET']),
+                    raise_on_status=False,
+                )
+                pool_size = env_int('DOWNLOAD_CONCURRENCY', 8)
+                adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+                session = requests.Session()
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                _session = session
+    return _session
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=env_int('DOWNLOAD_CONCURRENCY', 8),
+                                               thread_name_prefix='download')
+    return _executor
+
+
+def fetch(url):
+    """Descarga una URL con timeout por petición (conexión, lectura)"""
+    import requests
+
+    timeout = (env_float('DOWNLOAD_CONNECT_TIMEOUT', 5), env_float('DOWNLOAD_READ_TIMEOUT', 20))
+    try:
+        with stage('download'):
+            with get_session().get(url, timeout=timeout, stream=True) as response:
+                response.raise_for_status()
+                # Cada bloque cuenta para el límite de bytes de la petición (ver admission)
+                chunks = []
+                for chunk in response.iter_content(64 * 1024):
+                    charge_bytes(len(chunk))
+                    chunks.append(chunk)
+    except requests.RequestException as e:
+        raise DownloadError(url, str(e)) from e
+    return b''.join(chunks)
+
+
+def iter_downloads(urls, concurrency=None, total_timeout=None, limit=None):
+    """
+    Descarga las URLs concurrentemente y genera (índice, contenido) a medida
+    que cada descarga termina, con a lo sumo `concurrency` descargas en curso.
+    Si se pasa limit (función sin argumentos), solo se inician descargas de
+    índices menores que limit(): así quien consume controla cuánto se
+    adelanta la descarga (ver images._iter_process_indexed). Se consulta
+    cada vez que se reanuda el generador.
+    Lanza DownloadError si alguna descarga falla o si se agota el tiempo total.
+    """
+    concurrency = concurrency or env_int('DOWNLOAD_CONCURRENCY', 8)
+    total_timeout = total_timeout or env_float('DOWNLOAD_TOTAL_TIMEOUT', 60)
+    deadline = time.monotonic() + total_timeout
+    executor = _get_executor()
+    pending = enumerate(urls)
+    following = next(pending, None)
+    in_flight = {}
+
+    def submit_allowed():
+        nonlocal following
+        while following is not None and len(in_flight) < concurrency:
+            index, url = following
+            # Si no hay nada en curso se inicia igual, para no quedar esperando
+            if limit is not None and index >= limit() and in_flight:
+                return
+            in_flight[submit(executor, fetch, url)] = (index, url)
+            following = next(pending, None)
+
+    try:
+        submit_allowed()
+        while in_flight:
+            remaining = deadline - time.monotonic()
+            done, _ = wait(in_flight, timeout=max(0, min(remaining, time_left())), return_when=FIRST_COMPLETED)
+            if not done:
+                check_deadline()
+                _, url = next(iter(in_flight.values()))
+                raise DownloadError(url, f"tiempo total de descarga agotado ({total_timeout:g}s)")
+            for future in done:
+                index, _ = in_flight.pop(future)
+                content = future.result()
+                yield index, content
+                del content
+                submit_allowed()
+    finally:
+        for future in in_flight:
+            future.cancel()
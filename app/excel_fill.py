@@ -0,0 +1,200 @@
+import io
+import json
+import zipfile
+import logging
+from .template_registry import GASTOS_VIAJE, get_template_spec, load_template
+from .metrics import stage
+from .settlement import LIQUIDACION_CAMPOS, liquidar_viaje, liquidar_viajes
+from .xlsx_patch import fast_path_enabled, get_xlsx_patcher
+
+logger = logging.getLogger(__name__)
+
+def get_template_path(template=None):
+    """Ruta del .xlsx de la plantilla (por defecto GASTOS_VIAJE; ver template_registry)"""
+    return get_template_spec(template).path
+
+def obtener_celda_principal(hoja, celda, indice=None):
+    """
+    Obtiene la celda principal si está en un rango fusionado.
+    Si se pasa el índice precalculado (ver indice_celdas_fusionadas) la
+    búsqueda es directa; si no, se recorren los rangos fusionados de la hoja.
+    """
+    if indice is not None:
+        principal = indice.get(celda.coordinate)
+        return hoja[principal] if principal else celda
+    for merged_range in hoja.merged_cells.ranges:
+        if celda.coordinate in merged_range:
+            return hoja.cell(merged_range.min_row, merged_range.min_col)
+    return celda
+
+# Celdas de gastos y del resumen de la plantilla GASTOS_VIAJE (las de cada
+# variante se declaran en template_registry)
+GASTOS_MAPPING = GASTOS_VIAJE.gastos
+RESUMEN_CELDAS = GASTOS_VIAJE.resumen
+
+def _llenar_hoja(ws, plan, data, totales):
+    """Escribe en la hoja, según el plan de la plantilla, los datos y los totales de un viaje"""
+    if logger.isEnabledFor(logging.DEBUG):
+        gastos = data.get('gastos', {})
+        logger.debug("Gastos recibidos (%s): %s", type(gastos).__name__, gastos)
+        for (key, row, column) in plan.gastos:
+            logger.debug("  %s -> celda %s = %s", key, ws.cell(row, column).coordinate, gastos.get(key, 0))
+    plan.fill(ws, data, totales)
+
+def fill_excel_template(data, template=None):
+    """
+    Llena una plantilla (template, o la clave 'template' del payload; por
+    defecto GASTOS_VIAJE, ver template_registry) con los datos de un viaje.
+    Si data trae la clave 'viajes' (lista de payloads) se genera un solo
+    libro con una hoja por viaje y una hoja de resumen (ver
+    fill_excel_template_multi).
+    """
+    template = template or data.get('template')
+    if isinstance(data.get('viajes'), list):
+        return fill_excel_template_multi(data['viajes'], template)
+
+    # Logging de datos entrantes (nivel DEBUG, apagado por defecto)
+    logger.debug("Datos recibidos en fill_excel_template: %s", data)
+    
+    # Calcular totales (valor_viaje, total_gastos, menos_anticipo y saldos;
+    # ver settlement.liquidar)
+    totales = liquidar_viaje(data).viaje(0)
+
+    # Ruta rápida: parchar el XML de la hoja sobre los bytes de la plantilla
+    # (ver xlsx_patch); si no aplica, se llena con openpyxl
+    if fast_path_enabled():
+        patcher = get_xlsx_patcher(template)
+        if patcher is not None:
+            with stage('xlsx_patch'):
+                contenido = patcher.render(data, totales)
+            if contenido is not None:
+                return io.BytesIO(contenido)
+
+    # Copia de la plantilla precargada (se parsea una sola vez por worker)
+    # y su plan de celdas compilado
+    wb, ws, plan = load_template(template)
+
+    with stage('cell_fill'):
+        _llenar_hoja(ws, plan, data, totales)
+
+    # Guardar en buffer
+    buffer = io.BytesIO()
+    with stage('excel_save'):
+        wb.save(buffer)
+    buffer.seek(0)
+    return buffer
+
+def calcular_totales_viajes(viajes):
+    """
+    Calcula en una sola pasada vectorizada los totales de N viajes (ver
+    settlement.liquidar). Retorna un dict de arrays de longitud N, en pesos,
+    con valor_viaje, total_gastos, menos_anticipo, saldo_a_favor y saldo_en_contra.
+    """
+    liquidacion = liquidar_viajes(viajes)
+    return {campo: valores / 100 for campo, valores in liquidacion.cifras.items()}
+
+def fill_excel_template_multi(viajes, template=None):
+    """
+    Genera un solo libro con una copia de la hoja de la plantilla (por
+    defecto GASTOS_VIAJE) por viaje y una hoja 'Resumen' con los totales de
+    todos los viajes. El libro se guarda una sola vez.
+    """
+    from openpyxl.styles import Font
+
+    if not viajes:
+        raise ValueError("La lista de viajes está vacía")
+
+    wb, plantilla, plan = load_template(template)
+
+    liquidacion = liquidar_viajes(viajes)
+    columnas = list(LIQUIDACION_CAMPOS)
+    # Matriz N x 5 en pesos (tipos nativos de Python) para escribir en las celdas
+    filas_totales = liquidacion.filas()
+
+    # Copiar la hoja limpia antes de llenar cualquier viaje
+    hojas = [plantilla] + [wb.copy_worksheet(plantilla) for _ in viajes[1:]]
+    for numero, (ws, viaje, fila) in enumerate(zip(hojas, viajes, filas_totales), 1):
+        ws.title = f"Viaje {numero}"
+        with stage('cell_fill'):
+            _llenar_hoja(ws, plan, viaje, dict(zip(columnas, fila)))
+
+    # Hoja de resumen
+    resumen = wb.create_sheet("Resumen", 0)
+    encabezados = ['Hoja', 'Placa', 'Conductor', 'Desde', 'Hasta', 'Fecha',
+                   'Valor viaje', 'Total gastos', 'Menos anticipo',
+                   'Saldo a favor', 'Saldo en contra']
+    resumen.append(encabezados)
+    for numero, (viaje, fila) in enumerate(zip(viajes, filas_totales), 1):
+        resumen.append([f"Viaje {numero}", viaje.get('placa', ''), viaje.get('conductor', ''),
+                        viaje.get('desde', ''), viaje.get('hasta', ''), viaje.get('fecha', '')] + fila)
+    sumas = liquidacion.sumas()
+    sumas = [sumas[k] for k in columnas]
+    resumen.append(['TOTAL', '', '', '', '', ''] + sumas)
+
+    for cell in resumen[1]:
+        cell.font = Font(bold=True)
+    for cell in resumen[resumen.max_row]:
+        cell.font = Font(bold=True)
+    for row in resumen.iter_rows(min_row=2, min_col=7, max_col=len(encabezados)):
+        for cell in row:
+            cell.number_format = '#,##0.00'
+    wb.active = 0
+
+    # Guardar en buffer
+    buffer = io.BytesIO()
+    with stage('excel_save'):
+        wb.save(buffer)
+    buffer.seek(0)
+    return buffer
+
+# Bytes del ZIP que se acumulan antes de enviar una parte de la respuesta
+_ZIP_CHUNK_BYTES = 256 * 1024
+
+class _ZipStream:
+    """Destino de escritura no posicionable para zipfile; acumula bytes hasta drenarlos"""
+
+    def __init__(self):
+        self._chunks = []
+        self.size = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self.size += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        self.size = 0
+        return data
+
+def fill_excel_templates_zip(payloads, template=None):
+    """
+    Llena la plantilla (template, o la del payload) para cada payload y
+    genera, por partes, un ZIP con un .xlsx por viaje. Los libros se llenan
+    uno a uno (openpyxl y la ruta rápida no liberan el GIL, así que un pool
+    de hilos no los paraleliza): en memoria hay a lo sumo un libro y unos
+    _ZIP_CHUNK_BYTES del ZIP sin enviar.
+    Los payloads que fallan se reportan en errores.json al final del ZIP.
+    """
+    stream = _ZipStream()
+    errores = []
+
+    with zipfile.ZipFile(stream, 'w', compression=zipfile.ZIP_STORED) as zf:
+        for indice, payload in enumerate(payloads, 1):
+            try:
+                buffer = fill_excel_template(payload, template)
+            except Exception as e:
+                errores.append({"indice": indice, "error": str(e)})
+            else:
+                zf.writestr(f"gastos_viaje_{indice:04d}.xlsx", buffer.getbuffer())
+                del buffer
+            if stream.size >= _ZIP_CHUNK_BYTES:
+                yield stream.drain()
+
+        if errores:
+            zf.writestr("errores.json", json.dumps(errores, ensure_ascii=False))
+    yield stream.drain()
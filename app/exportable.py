@@ -0,0 +1,282 @@
+import io
+import os
+import math
+import tempfile
+from .metrics import stage
+
+EXPORTABLE_FIELD_MAPPING = {
+    'Cuenta': 'Cuenta',
+    'Comprobante': 'Comprobante',
+    'Fecha(mm/dd/yyyy)': 'Fecha(mm/dd/yyyy)',
+    'Documento': 'Documento',
+    'Documento Ref': 'Documento Ref',
+    'Nit': 'Nit',
+    'Detalle': 'Detalle',
+    'Tipo': 'Tipo',
+    'Valor': 'Valor',
+    'Base': 'Base',
+    'Centro de Costo': 'Centro de Costo',
+    'Trans. Ext': 'Trans. Ext',
+    'Plazo': 'Plazo'
+}
+
+EXPORTABLE_DEFAULT_HEADERS = [
+    'Cuenta', 'Comprobante', 'Fecha(mm/dd/yyyy)', 'Documento', 
+    'Documento Ref', 'Nit', 'Detalle', 'Tipo', 'Valor', 'Base', 
+    'Centro de Costo', 'Trans. Ext', 'Plazo'
+]
+
+# Ancho de cada columna del exportable
+EXPORTABLE_COLUMN_WIDTHS = {
+    'A': 12,  # Cuenta
+    'B': 12,  # Comprobante
+    'C': 15,  # Fecha
+    'D': 12,  # Documento
+    'E': 12,  # Documento Ref
+    'F': 15,  # Nit
+    'G': 30,  # Detalle
+    'H': 8,   # Tipo
+    'I': 12,  # Valor
+    'J': 12,  # Base
+    'K': 15,  # Centro de Costo
+    'L': 12,  # Trans. Ext
+    'M': 8    # Plazo
+}
+
+def _exportable_named_styles():
+    """Estilos con nombre del exportable: encabezado, texto, valores y tipo"""
+    from openpyxl.styles import NamedStyle, Font, Alignment, Border, Side, PatternFill
+
+    border_style = Border(
+        left=Side(style='thin'),
+        right=Side(style='thin'),
+        top=Side(style='thin'),
+        bottom=Side(style='thin')
+    )
+    return [
+        NamedStyle(
+            name='exportable_header',
+            font=Font(bold=True, color="FFFFFF"),
+            fill=PatternFill(start_color="366092", end_color="366092", fill_type="solid"),
+            alignment=Alignment(horizontal="center", vertical="center"),
+            border=border_style
+        ),
+        NamedStyle(name='exportable_cell', border=border_style),
+        NamedStyle(name='exportable_money', border=border_style, number_format='#,##0.00'),
+        NamedStyle(name='exportable_int', border=border_style, number_format='0'),
+    ]
+
+def _exportable_columns(headers):
+    """
+    Precalcula, por columna, el campo a leer de cada fila y el estilo que
+    lleva un valor numérico en ella (las demás celdas usan exportable_cell).
+    """
+    columns = []
+    for header in headers:
+        if header in ('Valor', 'Base'):
+            numeric_style = 'exportable_money'
+        elif header == 'Tipo':
+            numeric_style = 'exportable_int'
+        else:
+            numeric_style = 'exportable_cell'
+        columns.append((EXPORTABLE_FIELD_MAPPING.get(header, header), numeric_style))
+    return columns
+
+def _exportable_spool_max_bytes():
+    """Tamaño a partir del cual el Excel se pasa de memoria a disco (EXPORT_SPOOL_MAX_BYTES)"""
+    return int(os.environ.get('EXPORT_SPOOL_MAX_BYTES', 4 * 1024 * 1024))
+
+def generate_exportable_excel(exportable_data):
+    """
+    Genera un archivo Excel con los datos contables del exportable
+    Formato: Cuenta | Comprobante | Fecha | Documento | DocumentoRef | Nit | Detalle | Tipo | Valor | Base | Centro de Costo | Trans. Ext | Plazo
+
+    Usa un Workbook en modo solo escritura: las filas se agregan una a una
+    con estilos con nombre precalculados, así la memoria no crece con el
+    número de filas. 'data' puede ser cualquier iterable de filas.
+    Retorna un archivo temporal (en memoria hasta EXPORT_SPOOL_MAX_BYTES)
+    posicionado al inicio.
+    """
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    
+    # Crear nuevo workbook (solo escritura)
+    wb = Workbook(write_only=True)
+    for style in _exportable_named_styles():
+        wb.add_named_style(style)
+    ws = wb.create_sheet(exportable_data.get('sheetName', 'Exportable Contable'))
+    
+    # Obtener datos
+    data = exportable_data.get('data', [])
+    headers = exportable_data.get('headers', EXPORTABLE_DEFAULT_HEADERS)
+    columns = _exportable_columns(headers)
+
+    # Ajustar ancho de columnas (en modo solo escritura, antes de la primera fila)
+    for col_letter, width in EXPORTABLE_COLUMN_WIDTHS.items():
+        ws.column_dimensions[col_letter].width = width
+    
+    # Escribir headers
+    header_row = []
+    for header in headers:
+        cell = WriteOnlyCell(ws, value=header)
+        cell.style = 'exportable_header'
+        header_row.append(cell)
+    ws.append(header_row)
+    
+    # Escribir datos, una fila a la vez. ws.append serializa la fila de
+    # inmediato, así que cada columna reutiliza dos celdas ya estilizadas
+    # (texto y número) en lugar de crear y estilizar una celda por valor.
+    column_cells = []
+    for field_name, numeric_style in columns:
+        text_cell = WriteOnlyCell(ws)
+        text_cell.style = 'exportable_cell'
+        numeric_cell = WriteOnlyCell(ws)
+        numeric_cell.style = numeric_style
+        column_cells.append((field_name, text_cell, numeric_cell))
+
+    try:
+        with stage('excel_row_write'):
+            for row_data in data:
+                row = []
+                for field_name, text_cell, numeric_cell in column_cells:
+                    value = row_data.get(field_name, '')
+                    # Formatear números
+                    cell = numeric_cell if isinstance(value, (int, float)) else text_cell
+                    cell.value = value
+                    row.append(cell)
+                ws.append(row)
+    except Exception:
+        # Cerrar el escritor de la hoja (y su archivo temporal) antes de propagar
+        ws.close()
+        raise
+    
+    # Guardar en un archivo temporal
+    buffer = tempfile.SpooledTemporaryFile(max_size=_exportable_spool_max_bytes())
+    with stage('exportable_save'):
+        wb.save(buffer)
+    buffer.seek(0)
+    return buffer
+
+def _format_exportable_value(value, numeric_style):
+    """
+    Representación en texto de un valor del exportable con las mismas reglas
+    de formato del Excel: Valor/Base con '#,##0.00' y Tipo con '0'.
+    """
+    if value is None:
+        return ''
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        if numeric_style == 'exportable_money':
+            return f"{value:,.2f}"
+        if numeric_style == 'exportable_int':
+            return f"{value:.0f}"
+    return value
+
+def iter_exportable_rows(exportable_data):
+    """
+    Genera, una a una, las filas del exportable (primero los encabezados) con
+    el mismo orden de columnas y formato de números que generate_exportable_excel.
+    """
+    headers = exportable_data.get('headers', EXPORTABLE_DEFAULT_HEADERS)
+    columns = _exportable_columns(headers)
+    yield list(headers)
+    for row_data in exportable_data.get('data', []):
+        yield [_format_exportable_value(row_data.get(field_name, ''), numeric_style)
+               for field_name, numeric_style in columns]
+
+def generate_exportable_csv(exportable_data, rows_per_chunk=1000):
+    """
+    Genera el exportable como CSV (UTF-8) en partes de bytes, a medida que se
+    procesan las filas; sirve para responder en streaming.
+    """
+    import csv
+
+    text = io.StringIO()
+    writer = csv.writer(text, lineterminator='\r\n')
+    for count, row in enumerate(iter_exportable_rows(exportable_data), 1):
+        writer.writerow(row)
+        if count % rows_per_chunk == 0:
+            yield text.getvalue().encode('utf-8')
+            text.seek(0)
+            text.truncate()
+    if text.tell():
+        yield text.getvalue().encode('utf-8')
+
+# Formatos columnares soportados (requieren pyarrow)
+EXPORTABLE_COLUMNAR_FORMATS = ('parquet', 'arrow')
+
+# Extensión y tipo MIME de cada formato de salida del exportable
+EXPORTABLE_FORMATS = {
+    'xlsx': ('.xlsx', "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    # Flask/werkzeug agregan charset=utf-8 a los tipos text/*
+    'csv': ('.csv', "text/csv"),
+    'parquet': ('.parquet', "application/vnd.apache.parquet"),
+    'arrow': ('.arrow', "application/vnd.apache.arrow.file"),
+}
+
+def generate_exportable_columnar(exportable_data, fmt, rows_per_batch=50000):
+    """
+    Genera el exportable en formato Parquet o Arrow IPC (fmt) por lotes de filas.
+    Valor/Base se guardan como float64 redondeado a 2 decimales (también si
+    llegan como texto numérico) y el resto, Tipo incluido, como texto en el
+    orden de 'headers'; un Tipo numérico se escribe como en el CSV ('1') y
+    debe ser entero.
+    Retorna un archivo temporal posicionado al inicio.
+    Lanza ValueError si el formato no está soportado o pyarrow no está instalado.
+    """
+    if fmt not in EXPORTABLE_COLUMNAR_FORMATS:
+        raise ValueError(f"Formato no soportado: {fmt}")
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ValueError(f"El formato {fmt} requiere pyarrow, que no está instalado")
+
+    headers = exportable_data.get('headers', EXPORTABLE_DEFAULT_HEADERS)
+    columns = _exportable_columns(headers)
+    # Tipo va como texto: además de códigos numéricos admite letras (D/C),
+    # igual que el Excel y el CSV
+    schema = pa.schema([(header, pa.float64() if numeric_style == 'exportable_money' else pa.string())
+                        for header, (_, numeric_style) in zip(headers, columns)])
+
+    def convert(value, numeric_style, header):
+        if value is None or value == '':
+            return None
+        numeric = isinstance(value, (int, float)) and not isinstance(value, bool)
+        if numeric_style == 'exportable_money':
+            if numeric:
+                return round(float(value), 2)
+            try:
+                number = float(value.strip()) if isinstance(value, str) else math.nan
+            except ValueError:
+                number = math.nan
+            if not math.isfinite(number):
+                raise ValueError(f"La columna '{header}' tiene un valor no numérico: {value!r}")
+            return round(number, 2)
+        if numeric_style == 'exportable_int' and numeric:
+            if isinstance(value, float) and not value.is_integer():
+                raise ValueError(f"La columna '{header}' tiene un valor no entero: {value!r}")
+            return _format_exportable_value(value, numeric_style)
+        return str(value)
+
+    def batches():
+        batch = [[] for _ in columns]
+        for row_data in exportable_data.get('data', []):
+            for values, header, (field_name, numeric_style) in zip(batch, headers, columns):
+                values.append(convert(row_data.get(field_name, ''), numeric_style, header))
+            if len(batch[0]) >= rows_per_batch:
+                yield pa.record_batch(batch, schema=schema)
+                batch = [[] for _ in columns]
+        if batch[0] or not columns:
+            yield pa.record_batch(batch, schema=schema)
+
+    buffer = tempfile.SpooledTemporaryFile(max_size=_exportable_spool_max_bytes())
+    if fmt == 'parquet':
+        with pq.ParquetWriter(buffer, schema) as writer:
+            for batch in batches():
+                writer.write_batch(batch)
+    else:
+        with pa.ipc.new_file(buffer, schema) as writer:
+            for batch in batches():
+                writer.write_batch(batch)
+    buffer.seek(0)
+    return buffer
@@ -0,0 +1,168 @@
+import os
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+
+
+class ImageCache:
+    """
+    Caché direccionada por contenido de imágenes procesadas.
+
+    La llave es el hash SHA-256 de los bytes de la imagen original más los
+    parámetros del pipeline. Tiene dos niveles: uno en memoria, pequeño, con
+    desalojo LRU, y uno en disco con tamaño máximo y desalojo por fecha de
+    último uso (mtime). Lleva contadores de aciertos y fallos.
+    """
+
+    def __init__(self, directory, max_bytes, memory_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.memory_bytes = memory_bytes
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        self._memory_size = 0
+        self._disk_size = None
+        self._counters = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0}
+
+    @staticmethod
+    def make_key(img_data, params):
+        digest = hashlib.sha256(img_data)
+        digest.update(repr(sorted(params.items())).encode())
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key + '.jpg')
+
+    def _remember(self, key, data):
+        """Guarda en el nivel de memoria desalojando las entradas menos usadas"""
+        if len(data) > self.memory_bytes:
+            return
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return
+            self._memory[key] = data
+            self._memory_size += len(data)
+            while self._memory_size > self.memory_bytes:
+                _, old = self._memory.popitem(last=False)
+                self._memory_size -= len(old)
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def get(self, key):
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                self._counters['memory_hits'] += 1
+                return data
+
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)  # marca de último uso para el desalojo LRU
+        except OSError:
+            self._count('misses')
+            return None
+
+        self._count('disk_hits')
+        self._remember(key, data)
+        return data
+
+    def put(self, key, data):
+        self._remember(key, data)
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError:
+            return
+
+        self._count('stores')
+        with self._lock:
+            if self._disk_size is None:
+                self._disk_size = self._scan_size()
+            else:
+                self._disk_size += len(data)
+            over_limit = self._disk_size > self.max_bytes
+        if over_limit:
+            self._evict()
+
+    def _entries(self):
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith('.jpg'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def _scan_size(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def _evict(self):
+        """Elimina del disco las entradas menos usadas hasta quedar en el 90% del límite"""
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * 0.9
+        evicted = 0
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            evicted += 1
+        with self._lock:
+            self._disk_size = total
+            self._counters['evictions'] += evicted
+
+    def stats(self):
+        """Contadores de aciertos/fallos y ocupación de cada nivel"""
+        with self._lock:
+            stats = dict(self._counters)
+            stats['memory_entries'] = len(self._memory)
+            stats['memory_bytes'] = self._memory_size
+            stats['disk_bytes'] = self._disk_size
+        lookups = stats['memory_hits'] + stats['disk_hits'] + stats['misses']
+        stats['hit_rate'] = (stats['memory_hits'] + stats['disk_hits']) / lookups if lookups else 0.0
+        return stats
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_image_cache():
+    """
+    Retorna la caché (única por proceso) configurada con las variables de
+    entorno IMAGE_CACHE_DIR, IMAGE_CACHE_MAX_BYTES e IMAGE_CACHE_MEMORY_BYTES,
+    o None si IMAGE_CACHE=0.
+    """
+    global _cache
+    if os.environ.get('IMAGE_CACHE', '1') == '0':
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ImageCache(
+                    os.environ.get('IMAGE_CACHE_DIR',
+                                   os.path.join(tempfile.gettempdir(), 'fill_invoice_image_cache')),
+                    int(os.environ.get('IMAGE_CACHE_MAX_BYTES', 512 * 1024 * 1024)),
+                    int(os.environ.get('IMAGE_CACHE_MEMORY_BYTES', 32 * 1024 * 1024)),
+                )
+    return _cache
@@ -0,0 +1,140 @@
+import io
+import math
+
+# Calidad JPEG de las imágenes procesadas cuando no se reducen (la que usaba
+# cv2.imencode por defecto)
+PROCESSED_JPEG_QUALITY = 95
+
+
+def _draft_size(width, height, min_side):
+    """Tamaño pedido a PIL draft para que el lado mayor no quede por debajo de min_side"""
+    factor = min(1.0, min_side / max(width, height))
+    return max(1, math.ceil(width * factor)), max(1, math.ceil(height * factor))
+
+
+def image_pixels(img_data):
+    """
+    Píxeles (ancho x alto) de la imagen según su cabecera, sin decodificarla;
+    0 si PIL no reconoce los datos. Lanza LimitExceeded (413) si la imagen
+    supera Image.MAX_IMAGE_PIXELS (lo que PIL trata como bomba de
+    descompresión).
+    """
+    from PIL import Image
+    from .admission import LimitExceeded
+
+    try:
+        with Image.open(io.BytesIO(img_data)) as img:
+            pixels = img.width * img.height
+    except Image.DecompressionBombError:
+        pixels = None
+    except OSError:
+        # Incluye UnidentifiedImageError: datos que no son una imagen
+        return 0
+    limit = Image.MAX_IMAGE_PIXELS
+    # Entre MAX_IMAGE_PIXELS y el doble PIL solo avisa (DecompressionBombWarning)
+    if pixels is None or (limit and pixels > limit):
+        raise LimitExceeded(f"La imagen supera el máximo de {limit} píxeles por imagen")
+    return pixels
+
+
+def decode_image(img_data, gray=False, min_side=None):
+    """
+    Decodifica una imagen una sola vez a un array de NumPy listo para OpenCV:
+    2D en escala de grises si gray=True, o BGR.
+
+    - Aplica la orientación EXIF (fotos de celular giradas).
+    - Las imágenes con transparencia (RGBA, LA, paleta con transparencia) se
+      aplanan sobre fondo blanco; paleta, CMYK, 16 bits, etc. se convierten.
+    - Si min_side > 0 y la imagen es JPEG se decodifica reducida (1/2, 1/4,
+      1/8 con PIL draft) mientras el lado mayor siga siendo >= min_side.
+    """
+    import numpy as np
+    from PIL import Image, ImageOps
+
+    img = Image.open(io.BytesIO(img_data))
+    if min_side and img.format == 'JPEG' and max(img.size) > min_side:
+        img.draft('L' if gray else 'RGB', _draft_size(img.width, img.height, min_side))
+    img = ImageOps.exif_transpose(img)
+
+    if img.mode in ('RGBA', 'LA', 'PA') or (img.mode == 'P' and 'transparency' in img.info):
+        rgba = img.convert('RGBA')
+        img = Image.new('RGB', rgba.size, (255, 255, 255))
+        img.paste(rgba, mask=rgba.getchannel('A'))
+
+    if gray:
+        return np.asarray(img if img.mode == 'L' else img.convert('L'))
+    if img.mode == 'L':
+        return np.asarray(img)
+    rgb = np.asarray(img if img.mode == 'RGB' else img.convert('RGB'))
+    # RGB -> BGR sin copiar a una imagen intermedia de OpenCV
+    return np.ascontiguousarray(rgb[:, :, ::-1])
+
+
+class ProcessedImage:
+    """
+    Imagen lista para diagramar en el PDF, con sus dimensiones en píxeles.
+
+    Se construye a partir de los píxeles (array de NumPy, gris o BGR) que
+    deja el pipeline, o de un JPEG ya codificado (por ejemplo, desde la
+    caché). Se codifica a JPEG una sola vez, al embeberla (jpeg_for_box), y
+    un JPEG existente se embebe sin decodificarlo si no hay que reducirlo.
+    """
+    __slots__ = ('pixels', 'width', 'height', 'components', '_jpeg')
+
+    def __init__(self, pixels=None, jpeg=None, info=None):
+        self.pixels = pixels
+        self._jpeg = jpeg
+        if pixels is not None:
+            self.height, self.width = pixels.shape[:2]
+            self.components = 1 if pixels.ndim == 2 else pixels.shape[2]
+        else:
+            self.width, self.height, self.components = info
+
+    @classmethod
+    def from_bytes(cls, img_data):
+        """Un JPEG se conserva tal cual (solo se lee su cabecera); otros formatos se decodifican"""
+        from .pdf_writer import jpeg_info
+
+        try:
+            return cls(jpeg=img_data, info=jpeg_info(img_data))
+        except Exception:
+            return cls(pixels=decode_image(img_data))
+
+    @property
+    def size(self):
+        return self.width, self.height
+
+    def to_jpeg(self):
+        """JPEG a PROCESSED_JPEG_QUALITY (se codifica una vez y se reutiliza)"""
+        if self._jpeg is None:
+            self._jpeg = _encode(self.pixels, PROCESSED_JPEG_QUALITY)
+        return self._jpeg
+
+    def jpeg_for_box(self, box_width, box_height, dpi, quality):
+        """
+        JPEG para embeber en una caja de box_width x box_height puntos.
+        Si dpi > 0 y la imagen tiene más píxeles de los que la caja necesita
+        a ese DPI, se reduce (INTER_AREA) y se codifica con quality; si no,
+        se usa to_jpeg(). Retorna (jpeg, (ancho, alto, componentes)).
+        """
+        info = (self.width, self.height, self.components)
+        if dpi:
+            target_width = max(1, math.ceil(box_width / 72 * dpi))
+            target_height = max(1, math.ceil(box_height / 72 * dpi))
+            if self.width > target_width or self.height > target_height:
+                if self.pixels is None:
+                    from .pdf_writer import fit_jpeg_to_box
+                    return fit_jpeg_to_box(self._jpeg, info, box_width, box_height, dpi, quality)
+                import cv2
+                resized = cv2.resize(self.pixels, (target_width, target_height), interpolation=cv2.INTER_AREA)
+                return _encode(resized, quality), (target_width, target_height, self.components)
+        return self.to_jpeg(), info
+
+
+def _encode(pixels, quality):
+    import cv2
+
+    ok, buffer = cv2.imencode('.jpg', pixels, [cv2.IMWRITE_JPEG_QUALITY, int(quality)])
+    if not ok:
+        raise ValueError("No se pudo codificar la imagen a JPEG")
+    return buffer.tobytes()
@@ -0,0 +1,302 @@
+import os
+import logging
+import threading
+from concurrent.futures import Future
+from .image_cache import get_image_cache
+from .downloader import iter_downloads
+from .metrics import stage, submit
+from .image_io import ProcessedImage, decode_image, image_pixels
+from .admission import charge_pixels, check_deadline
+
+logger = logging.getLogger(__name__)
+
+def _detection_max_side():
+    """
+    Lado mayor (px) de la copia reducida usada para detectar el documento
+    (variable de entorno IMAGE_DETECTION_MAX_SIDE); 0 usa la resolución completa.
+    """
+    return max(0, int(os.environ.get('IMAGE_DETECTION_MAX_SIDE', 1000)))
+
+# Versión del pipeline de process_image; cambiarla invalida la caché de imágenes
+IMAGE_PIPELINE_VERSION = 2
+
+def detect_document_contour(image):
+    """
+    Busca el contorno del documento en una imagen BGR o en escala de grises.
+    Retorna los 4 puntos (shape (4, 1, 2)) o None si no encuentra un candidato.
+    """
+    import cv2
+    import numpy as np
+
+    height, width = image.shape[:2]
+    document_contour = None
+
+    # Preprocesamiento suave
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    blur = cv2.GaussianBlur(gray, (3, 3), 0)
+    
+    # Detección de bordes
+    edges = cv2.Canny(blur, 30, 100, apertureSize=3)
+    
+    # Dilatación mínima
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (2, 2))
+    edges = cv2.dilate(edges, kernel, iterations=1)
+    
+    # Encontrar contornos
+    contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    contours = sorted(contours, key=cv2.contourArea, reverse=True)
+    
+    max_area = 0
+    image_area = width * height
+    
+    # Buscar contorno del documento
+    for contour in contours[:15]:
+        area = cv2.contourArea(contour)
+        
+        if area > image_area * 0.25:
+            peri = cv2.arcLength(contour, True)
+            approx = cv2.approxPolyDP(contour, 0.015 * peri, True)
+            
+            if len(approx) >= 4 and area > max_area:
+                if len(approx) > 4:
+                    contour_points = approx.reshape(-1, 2)
+                    tl = contour_points[np.argmin(contour_points[:, 0] + contour_points[:, 1])]
+                    tr = contour_points[np.argmin(contour_points[:, 1] - contour_points[:, 0])]
+                    br = contour_points[np.argmax(contour_points[:, 0] + contour_points[:, 1])]
+                    bl = contour_points[np.argmax(contour_points[:, 1] - contour_points[:, 0])]
+                    approx = np.array([tl, tr, br, bl]).reshape(4, 1, 2)
+                
+                document_contour = approx
+                max_area = area
+
+    return document_contour
+
+def detect_document_contour_scaled(image, max_side):
+    """
+    Detecta el contorno sobre una copia reducida (lado mayor = max_side) y
+    escala los 4 puntos de vuelta a las coordenadas de la imagen original.
+    """
+    import cv2
+    import numpy as np
+
+    height, width = image.shape[:2]
+    scale = max_side / max(height, width)
+    if not max_side or scale >= 1:
+        return detect_document_contour(image)
+
+    # La reducción se hace sobre la imagen en grises (un solo canal)
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    proxy = cv2.resize(gray, (max(1, round(width * scale)), max(1, round(height * scale))),
+                       interpolation=cv2.INTER_LINEAR)
+    contour = detect_document_contour(proxy)
+    if contour is None:
+        return None
+    return contour.astype(np.float32) / scale
+
+def process_image_data(img_data, detection_max_side=None, decode_max_side=None):
+    """
+    Procesa una imagen para detectar y recortar el documento, decodificándola
+    una sola vez. Todo el pipeline trabaja en escala de grises, que es lo que
+    produce el realce de contraste final.
+    El contorno se detecta sobre una copia reducida (detection_max_side,
+    por defecto IMAGE_DETECTION_MAX_SIDE) y el recorte se hace sobre la
+    imagen decodificada; si decode_max_side > 0 un JPEG se decodifica ya
+    reducido mientras su lado mayor no baje de ese valor (ver decode_image).
+    Retorna una ProcessedImage sin codificar, o None si el procesamiento falla.
+    """
+    import cv2
+    import numpy as np
+    from imutils.perspective import four_point_transform
+
+    if detection_max_side is None:
+        detection_max_side = _detection_max_side()
+    try:
+        # Decodificar una sola vez (orientación EXIF, transparencia, paletas)
+        with stage('decode'):
+            image = decode_image(img_data, gray=True, min_side=decode_max_side)
+        
+        # Detectar el documento; si no se encuentra se usa la imagen completa
+        height, width = image.shape[:2]
+        with stage('edge_detection'):
+            document_contour = detect_document_contour_scaled(image, detection_max_side)
+        if document_contour is None:
+            document_contour = np.array([[0, 0], [width, 0], [width, height], [0, height]])
+        
+        # Aplicar transformación de perspectiva
+        with stage('warp'):
+            warped = four_point_transform(image, document_contour.reshape(4, 2))
+        
+        # Aplicar margen mínimo
+        h, w = warped.shape[:2]
+        margin_percent = 0.005
+        margin = max(2, int(min(h, w) * margin_percent))
+        
+        if h > 2*margin and w > 2*margin:
+            cropped = warped[margin:h-margin, margin:w-margin]
+        else:
+            cropped = warped
+        
+        # Mejorar contraste
+        with stage('clahe'):
+            clahe = cv2.createCLAHE(clipLimit=1.5, tileGridSize=(8, 8))
+            final_image = clahe.apply(np.ascontiguousarray(cropped))
+        
+        # Asegurar que la imagen sea vertical (retrato)
+        h, w = final_image.shape[:2]
+        if w > h:  # Si es horizontal, rotarla 90 grados
+            final_image = cv2.rotate(final_image, cv2.ROTATE_90_CLOCKWISE)
+        
+        return ProcessedImage(pixels=final_image)
+        
+    except Exception as e:
+        logger.warning("Error procesando imagen: %s", e)
+        return None
+
+def process_image(img_data, detection_max_side=None):
+    """
+    Procesa una imagen para detectar y recortar el documento (ver
+    process_image_data) y la retorna como JPEG. Si el procesamiento falla
+    retorna la imagen original.
+    """
+    result = process_image_data(img_data, detection_max_side)
+    if result is None:
+        return img_data
+    with stage('encode'):
+        return result.to_jpeg()
+
+_image_pools = {}
+_image_pools_lock = threading.Lock()
+
+def _image_workers():
+    """Número de workers para procesar imágenes (variable de entorno IMAGE_WORKERS)"""
+    return max(1, int(os.environ.get('IMAGE_WORKERS', os.cpu_count() or 1)))
+
+def _get_image_pool(workers):
+    """
+    Pool (único por proceso) para procesar imágenes. Por defecto usa hilos,
+    ya que OpenCV libera el GIL; con IMAGE_POOL=process usa procesos.
+    """
+    from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+    kind = os.environ.get('IMAGE_POOL', 'thread')
+    with _image_pools_lock:
+        pool = _image_pools.get((kind, workers))
+        if pool is None:
+            executor = ProcessPoolExecutor if kind == 'process' else ThreadPoolExecutor
+            pool = _image_pools[(kind, workers)] = executor(max_workers=workers)
+    return pool
+
+def _image_cache_params(decode_max_side=None):
+    """Parámetros del pipeline que forman parte de la llave de la caché"""
+    params = {'pipeline': IMAGE_PIPELINE_VERSION, 'detection_max_side': _detection_max_side()}
+    if decode_max_side:
+        params['decode_max_side'] = decode_max_side
+    return params
+
+def _process_and_store(img_data, decode_max_side, key):
+    """
+    process_image_data y, si hay llave, guarda el resultado en la caché. Corre
+    en el worker del pool, así el JPEG para la caché no se codifica en el
+    hilo de la petición (con IMAGE_POOL=process se guarda desde el proceso
+    hijo: el nivel en disco es compartido).
+    """
+    result = process_image_data(img_data, None, decode_max_side)
+    cache = get_image_cache() if key is not None else None
+    # Si el procesamiento falló (None) no se guarda nada
+    if cache is not None and result is not None:
+        with stage('encode'):
+            cache.put(key, result.to_jpeg())
+    return result
+
+def _iter_process_indexed(source, max_workers=None, decode_max_side=None):
+    """
+    Procesa imágenes que llegan como (índice, bytes), posiblemente en
+    desorden, y genera las imágenes procesadas (ProcessedImage) en orden de
+    índice. Si una imagen no se puede procesar se genera la original.
+
+    source(limit) retorna el iterable de (índice, bytes); limit() es el
+    índice hasta el que (sin incluirlo) la fuente puede adelantarse, para
+    que una imagen lenta no haga que se descarguen todas las siguientes
+    (ver downloader.iter_downloads).
+
+    Las imágenes en caché no se procesan ni se decodifican; las demás se
+    guardan en la caché desde el worker que las procesa. Como máximo hay
+    2 * workers imágenes pendientes (en proceso o esperando su turno): con
+    la ventana llena no se toma otra imagen hasta entregar la siguiente en
+    orden, así la memoria no crece con el número total de imágenes.
+    """
+    workers = max_workers or _image_workers()
+    pool = _get_image_pool(workers) if workers > 1 else None
+    cache = get_image_cache()
+    params = _image_cache_params(decode_max_side)
+    window = 2 * workers
+    pending = {}
+    next_index = 0
+
+    def resolved(result):
+        future = Future()
+        future.set_result(result)
+        return future
+
+    def finish(entry):
+        future, img_data = entry
+        result = future.result()
+        # Si el procesamiento falló se usa la imagen original
+        return result if result is not None else ProcessedImage.from_bytes(img_data)
+
+    for index, img_data in source(lambda: next_index + window):
+        # Límites de la petición (ver admission): tiempo y píxeles a decodificar
+        check_deadline()
+        charge_pixels(image_pixels(img_data))
+        key = cache.make_key(img_data, params) if cache else None
+        cached = cache.get(key) if cache else None
+        if cached is not None:
+            pending[index] = (resolved(ProcessedImage.from_bytes(cached)), None)
+        elif pool is not None:
+            pending[index] = (submit(pool, _process_and_store, img_data, decode_max_side, key), img_data)
+        else:
+            pending[index] = (resolved(_process_and_store(img_data, decode_max_side, key)), img_data)
+        del img_data
+
+        while next_index in pending and (pending[next_index][0].done() or len(pending) >= window):
+            yield finish(pending.pop(next_index))
+            next_index += 1
+
+    while next_index in pending:
+        yield finish(pending.pop(next_index))
+        next_index += 1
+
+def iter_processed_images(images_data, max_workers=None, decode_max_side=None):
+    """
+    Procesa (en paralelo) un iterable de imágenes y genera los resultados en
+    orden, uno a la vez, como ProcessedImage (sin codificar). Las imágenes ya
+    procesadas antes (mismos bytes y mismos parámetros) se toman de la caché.
+    """
+    return _iter_process_indexed(lambda limit: enumerate(images_data), max_workers, decode_max_side)
+
+def iter_process_images(images_data, max_workers=None):
+    """Igual que iter_processed_images, pero genera cada imagen como JPEG"""
+    for result in iter_processed_images(images_data, max_workers):
+        yield result.to_jpeg()
+
+def process_images(images_data, max_workers=None):
+    """
+    Procesa varias imágenes en paralelo con process_image.
+    El resultado conserva el orden de entrada.
+    """
+    return list(iter_process_images(images_data, max_workers))
+
+def iter_download_processed_images(image_urls, max_workers=None, decode_max_side=None):
+    """
+    Descarga las imágenes concurrentemente y empieza a procesar cada una
+    apenas llega, mientras las demás siguen descargándose.
+    Genera las imágenes procesadas (ProcessedImage) en el orden de image_urls.
+    Lanza DownloadError si alguna descarga falla.
+    """
+    return _iter_process_indexed(lambda limit: iter_downloads(image_urls, limit=limit), max_workers,
+                                 decode_max_side)
+
+def iter_download_and_process_images(image_urls, max_workers=None):
+    """Igual que iter_download_processed_images, pero genera cada imagen como JPEG"""
+    for result in iter_download_processed_images(image_urls, max_workers):
+        yield result.to_jpeg()
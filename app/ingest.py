@@ -0,0 +1,95 @@
+import json
+import tempfile
+from itertools import chain
+from .exportable import _exportable_spool_max_bytes
+
+# Tipos de contenido aceptados para la ingesta por líneas (NDJSON)
+NDJSON_MIMETYPES = ('application/x-ndjson', 'application/ndjson', 'application/jsonl')
+
+# Claves del payload JSON normal que se pueden enviar en la línea de opciones
+EXPORTABLE_OPTION_KEYS = ('headers', 'sheetName', 'filename', 'format')
+
+
+class InvalidRowError(ValueError):
+    """Una línea del cuerpo NDJSON no es un objeto JSON válido"""
+
+    def __init__(self, line_number, message):
+        self.line_number = line_number
+        super().__init__(f"Línea {line_number}: {message}")
+
+
+def iter_ndjson(stream):
+    """
+    Lee el stream línea por línea y genera (número de línea, objeto) por cada
+    línea no vacía, sin cargar el cuerpo completo en memoria.
+    """
+    for line_number, line in enumerate(iter(stream.readline, b''), 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield line_number, json.loads(line)
+        except ValueError as e:
+            raise InvalidRowError(line_number, f"JSON inválido ({e})")
+
+
+def _validated_rows(entries):
+    """Aplica a cada fila la validación que antes se hacía sobre la lista 'data'"""
+    for line_number, row in entries:
+        if not isinstance(row, dict):
+            raise InvalidRowError(line_number, "cada fila de 'data' debe ser un objeto")
+        yield row
+
+
+def read_ndjson_exportable(stream):
+    """
+    Construye el payload del exportable a partir de un cuerpo NDJSON.
+
+    La primera línea puede ser {"options": {...}} con las mismas claves del
+    payload JSON (headers, sheetName, filename, format); cada línea siguiente
+    es una fila de 'data'. 'data' es un generador que valida y entrega las
+    filas a medida que se leen del stream. La línea de opciones y la primera
+    fila se leen de inmediato, para que un cuerpo mal formado falle antes de
+    empezar a responder.
+    """
+    entries = iter_ndjson(stream)
+    exportable_data = {}
+
+    first = next(entries, None)
+    if first is not None and isinstance(first[1], dict) and set(first[1]) == {'options'}:
+        options = first[1]['options']
+        if not isinstance(options, dict):
+            raise InvalidRowError(first[0], "'options' debe ser un objeto")
+        exportable_data.update((k, v) for k, v in options.items() if k in EXPORTABLE_OPTION_KEYS)
+        first = next(entries, None)
+
+    rows = _validated_rows(chain([first], entries) if first is not None else entries)
+    first_row = next(rows, None)
+    exportable_data['data'] = chain([first_row], rows) if first_row is not None else rows
+    return exportable_data
+
+
+def spool_rows(rows):
+    """
+    Lee y valida todas las filas antes de responder (para el CSV en
+    streaming, donde un error a mitad de la respuesta ya no puede ser un
+    400). Las filas quedan en un archivo temporal, en memoria hasta
+    EXPORT_SPOOL_MAX_BYTES, y se retorna un generador que las vuelve a leer.
+    Lanza InvalidRowError si alguna línea es inválida.
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=_exportable_spool_max_bytes())
+    try:
+        for row in rows:
+            spool.write(json.dumps(row, ensure_ascii=False).encode('utf-8'))
+            spool.write(b'\n')
+    except Exception:
+        spool.close()
+        raise
+    spool.seek(0)
+    return _replay(spool)
+
+
+def _replay(spool):
+    with spool:
+        for line in spool:
+            yield json.loads(line)
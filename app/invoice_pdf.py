@@ -0,0 +1,195 @@
+import os
+import math
+import tempfile
+from .images import iter_processed_images, iter_download_processed_images
+from .image_io import ProcessedImage
+from .layout import shelf_pack
+from .metrics import stage
+from .admission import check_deadline
+
+def generate_invoice_pdf(images_data, dpi=None, jpeg_quality=None):
+    """
+    Genera un PDF con las imágenes de facturas organizadas dinámicamente manteniendo su proporción.
+    images_data: Iterable de bytes de las imágenes (puede ser un generador)
+    dpi / jpeg_quality: ver render_invoice_pdf
+    Retorna un archivo temporal (en memoria hasta PDF_SPOOL_MAX_BYTES) posicionado al inicio.
+    """
+    dpi = _pdf_image_dpi() if dpi is None else dpi
+    # Procesar las imágenes (en paralelo) para detectar y recortar el documento;
+    # cada imagen se decodifica una vez y se codifica una vez, al embeberla
+    processed = iter_processed_images(images_data, decode_max_side=_decode_max_side(dpi))
+    return render_invoice_pdf(processed, dpi, jpeg_quality)
+
+def generate_invoice_pdf_from_urls(image_urls, dpi=None, jpeg_quality=None):
+    """
+    Igual que generate_invoice_pdf, pero descargando las imágenes desde
+    image_urls; la descarga y el procesamiento se solapan.
+    """
+    dpi = _pdf_image_dpi() if dpi is None else dpi
+    processed = iter_download_processed_images(image_urls, decode_max_side=_decode_max_side(dpi))
+    return render_invoice_pdf(processed, dpi, jpeg_quality)
+
+def _decode_max_side(dpi):
+    """
+    Lado mayor (px) al que una foto se puede decodificar reducida sin que su
+    documento quede por debajo de dpi en el PDF. La caja más grande mide
+    0.48 del alto de la página y el documento puede ocupar solo parte de la
+    foto, así que se deja un factor 2. Sin dpi objetivo (0) no se reduce.
+    """
+    if not dpi:
+        return 0
+    from reportlab.lib.pagesizes import A4
+    return math.ceil(A4[1] * 0.48 / 72 * dpi * 2)
+
+def _pdf_spool_max_bytes():
+    """Tamaño a partir del cual el PDF se pasa de memoria a disco (PDF_SPOOL_MAX_BYTES)"""
+    return int(os.environ.get('PDF_SPOOL_MAX_BYTES', 4 * 1024 * 1024))
+
+def _pdf_image_dpi():
+    """DPI objetivo de las imágenes embebidas (PDF_IMAGE_DPI); 0 las embebe sin cambios"""
+    return max(0, int(os.environ.get('PDF_IMAGE_DPI', 0)))
+
+def _pdf_image_quality():
+    """Calidad JPEG al re-codificar imágenes reducidas (PDF_IMAGE_QUALITY)"""
+    return int(os.environ.get('PDF_IMAGE_QUALITY', 75))
+
+def _pdf_layout():
+    """Modo de diagramación del PDF (PDF_LAYOUT): 'flow' (por defecto) o 'shelf'"""
+    return os.environ.get('PDF_LAYOUT', 'flow')
+
+def _prepare_pdf_images(processed_images, max_width, max_height, dpi, jpeg_quality):
+    """
+    Calcula, para cada imagen procesada (ProcessedImage o bytes), su tamaño
+    final en la página (manteniendo la proporción), la reduce al DPI
+    objetivo y la codifica a JPEG, una sola vez.
+    Genera (jpeg, info, final_width, final_height) una imagen a la vez.
+    """
+    # TAMAÑOS REDUCIDOS para que quepan más imágenes por página
+    # Reducción del 40% de los tamaños anteriores
+    max_image_width = max_width * 0.48   # Reducido 40% desde 0.8
+
+    for image in processed_images:
+        check_deadline()
+        # Dimensiones de la imagen ya decodificada (o de la cabecera del JPEG)
+        if not isinstance(image, ProcessedImage):
+            image = ProcessedImage.from_bytes(image)
+        original_width, original_height = image.size
+        aspect_ratio = original_width / original_height
+
+        # Calcular el tamaño final manteniendo la proporción
+        if aspect_ratio > 1:  # Imagen horizontal
+            final_width = min(max_image_width, max_width * 0.45)  # Reducido 40% desde 0.75
+            final_height = final_width / aspect_ratio
+        else:  # Imagen vertical (típico para facturas de celular)
+            # Para facturas verticales, usar espacio reducido
+            final_width = min(max_image_width, max_width * 0.42)   # Reducido 40% desde 0.7
+            final_height = final_width / aspect_ratio
+            # Si el alto se pasa, limitar el espacio vertical
+            if final_height > max_height * 0.48:  # Reducido 40% desde 0.8
+                final_height = max_height * 0.48
+                final_width = final_height * aspect_ratio
+
+        # Reducir la imagen al tamaño que ocupa en la página y codificarla
+        with stage('encode'):
+            jpeg_data, info = image.jpeg_for_box(final_width, final_height, dpi, jpeg_quality)
+        del image
+
+        yield jpeg_data, info, final_width, final_height
+        del jpeg_data
+
+def render_invoice_pdf(processed_images, dpi=None, jpeg_quality=None, layout=None):
+    """
+    Diagrama en el PDF las imágenes ya procesadas (ProcessedImage o bytes),
+    en orden. Consume las imágenes una a una: cada imagen y cada página se
+    escriben en un archivo temporal apenas se dibujan, y luego se liberan.
+    Si dpi > 0 (por defecto PDF_IMAGE_DPI) cada imagen se reduce a los
+    píxeles que necesita su caja a ese DPI y se codifica con jpeg_quality
+    (por defecto PDF_IMAGE_QUALITY); si no, se codifica con calidad
+    PROCESSED_JPEG_QUALITY, o se embebe tal cual si ya es un JPEG.
+    layout (por defecto PDF_LAYOUT): 'flow' coloca las imágenes en filas en
+    el orden de llegada; 'shelf' las reordena por estantes (ver
+    layout.shelf_pack) para llenar mejor las páginas y marca cada imagen con
+    su número original.
+    """
+    from reportlab.lib.pagesizes import A4
+    from .pdf_writer import StreamingPDFWriter
+
+    dpi = _pdf_image_dpi() if dpi is None else dpi
+    jpeg_quality = jpeg_quality or _pdf_image_quality()
+    layout = layout or _pdf_layout()
+    buffer = tempfile.SpooledTemporaryFile(max_size=_pdf_spool_max_bytes())
+    c = StreamingPDFWriter(buffer, pagesize=A4)
+    width, height = A4
+
+    # Configuración de márgenes y espaciado
+    margin = 20  # Reducido para más espacio
+    spacing = 15
+    max_width = width - (2 * margin)
+    max_height = height - (2 * margin)
+
+    images = _prepare_pdf_images(processed_images, max_width, max_height, dpi, jpeg_quality)
+    if layout == 'shelf':
+        _render_shelf_layout(c, images, margin, spacing)
+    else:
+        _render_flow_layout(c, images, margin, spacing)
+
+    with stage('pdf_save'):
+        c.save()
+    buffer.seek(0)
+    return buffer
+
+def _render_flow_layout(c, images, margin, spacing):
+    """Coloca las imágenes en filas, en el orden de llegada"""
+    width, height = c.pagesize
+    current_x = margin
+    current_y = height - margin
+    current_row_height = 0
+    page_number = 1
+
+    for jpeg_data, info, final_width, final_height in images:
+        # Verificar si la imagen cabe en la fila actual
+        if current_x + final_width > width - margin:
+            current_x = margin
+            current_y -= (current_row_height + spacing)
+            current_row_height = 0
+
+        # Verificar si la imagen cabe en la página actual
+        if current_y - final_height < margin:
+            c.show_page()
+            current_x = margin
+            current_y = height - margin
+            current_row_height = 0
+            page_number += 1
+
+        # Dibujar la imagen (se escribe al archivo y se libera)
+        y_position = current_y - final_height
+        with stage('pdf_write_image'):
+            c.draw_jpeg(jpeg_data, current_x, y_position, final_width, final_height, info=info)
+        del jpeg_data
+
+        # Actualizar posiciones
+        current_x += final_width + spacing
+        current_row_height = max(current_row_height, final_height)
+
+def _render_shelf_layout(c, images, margin, spacing):
+    """
+    Escribe cada imagen al archivo apenas llega y, con todos los tamaños
+    conocidos, las diagrama por estantes. Cada imagen lleva una etiqueta con
+    su número en el orden de entrada.
+    """
+    width, height = c.pagesize
+    items = []
+    for jpeg_data, info, final_width, final_height in images:
+        with stage('pdf_write_image'):
+            items.append((c.add_jpeg(jpeg_data, info), final_width, final_height))
+        del jpeg_data
+    numbers = {image_ref: number for number, (image_ref, _, _) in enumerate(items, 1)}
+
+    with stage('layout'):
+        pages = shelf_pack(items, width, height, margin, spacing)
+    for page_number, placements in enumerate(pages):
+        if page_number:
+            c.show_page()
+        for placement in placements:
+            c.draw_image(placement.key, placement.x, placement.y, placement.width, placement.height)
+            c.draw_label(placement.x, placement.y + placement.height, str(numbers[placement.key]))
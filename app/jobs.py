@@ -0,0 +1,180 @@
+import os
+import re
+import json
+import time
+import uuid
+import shutil
+import tempfile
+import threading
+
+# Estados de un trabajo
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+_JOB_ID = re.compile(r'^[0-9a-f]{32}$')
+
+
+class JobQueueFull(Exception):
+    """La cola de trabajos está llena; el cliente debe reintentar más tarde"""
+
+
+class JobQueue:
+    """
+    Cola de trabajos en proceso para generar reportes grandes fuera de la
+    petición HTTP.
+
+    Los trabajos corren en un pool local de hilos. La cola está acotada: a lo
+    sumo max_pending trabajos en espera o en curso por proceso; submit lanza
+    JobQueueFull si no hay cupo. El estado (JSON) y el resultado de cada
+    trabajo se guardan en el directorio de spool, así cualquier worker de
+    gunicorn puede responder el estado o la descarga. Los trabajos se borran
+    ttl segundos después de su última actualización.
+    """
+
+    def __init__(self, directory, workers, max_pending, ttl):
+        self.directory = directory
+        self.workers = workers
+        self.max_pending = max_pending
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._executor = None
+        self._last_purge = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _get_executor(self):
+        from concurrent.futures import ThreadPoolExecutor
+
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='job')
+        return self._executor
+
+    def _meta_path(self, job_id):
+        return os.path.join(self.directory, job_id + '.json')
+
+    def result_path(self, job_id):
+        return os.path.join(self.directory, job_id + '.out')
+
+    def _write_meta(self, job_id, meta):
+        meta = dict(meta, updated=time.time())
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(tmp_path, self._meta_path(job_id))
+        return meta
+
+    def submit(self, kind, func, args, filename, mimetype):
+        """
+        Encola func(*args), que debe retornar un archivo posicionado al inicio
+        o un iterable de bytes. Retorna el estado inicial del trabajo.
+        Lanza JobQueueFull si ya hay max_pending trabajos pendientes.
+        """
+        self.purge_expired()
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise JobQueueFull(f"Hay {self.max_pending} trabajos pendientes; intente más tarde")
+            self._pending += 1
+
+        job_id = uuid.uuid4().hex
+        meta = self._write_meta(job_id, {
+            'job_id': job_id, 'kind': kind, 'status': QUEUED, 'filename': filename,
+            'mimetype': mimetype, 'created': time.time(), 'error': None,
+        })
+        try:
+            self._get_executor().submit(self._run, meta, func, args)
+        except Exception:
+            self._release()
+            raise
+        return meta
+
+    def _run(self, meta, func, args):
+        # El cupo se libera antes de publicar el estado final: un cliente que
+        # ve 'done' o 'failed' puede volver a encolar sin recibir un 429
+        job_id = meta['job_id']
+        try:
+            meta = self._write_meta(job_id, dict(meta, status=RUNNING, started=time.time()))
+            result = func(*args)
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    if hasattr(result, 'read'):
+                        shutil.copyfileobj(result, f)
+                        result.close()
+                    else:
+                        for chunk in result:
+                            f.write(chunk)
+                os.replace(tmp_path, self.result_path(job_id))
+            except BaseException:
+                os.remove(tmp_path)
+                raise
+            size = os.path.getsize(self.result_path(job_id))
+        except Exception as e:
+            self._release()
+            self._write_meta(job_id, dict(meta, status=FAILED, finished=time.time(), error=str(e)))
+        except BaseException:
+            self._release()
+            raise
+        else:
+            self._release()
+            self._write_meta(job_id, dict(meta, status=DONE, finished=time.time(), size=size))
+
+    def _release(self):
+        with self._lock:
+            self._pending -= 1
+
+    def status(self, job_id):
+        """Retorna el estado del trabajo o None si no existe o ya expiró"""
+        if not _JOB_ID.match(job_id):
+            return None
+        self.purge_expired()
+        try:
+            with open(self._meta_path(job_id)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def purge_expired(self, force=False):
+        """Borra los trabajos (estado y resultado) sin actualizar hace más de ttl segundos"""
+        now = time.time()
+        with self._lock:
+            if not force and now - self._last_purge < min(60, self.ttl):
+                return
+            self._last_purge = now
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                if now - os.stat(path).st_mtime > self.ttl:
+                    os.remove(path)
+            except OSError:
+                continue
+
+    def stats(self):
+        """Ocupación de la cola en este proceso"""
+        with self._lock:
+            pending = self._pending
+        return {'max_pending': self.max_pending, 'workers': self.workers, 'pending': pending, 'ttl': self.ttl}
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_job_queue():
+    """
+    Retorna la cola (única por proceso) configurada con las variables de
+    entorno JOBS_SPOOL_DIR, JOBS_WORKERS, JOBS_MAX_PENDING y JOBS_TTL.
+    """
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                _queue = JobQueue(
+                    os.environ.get('JOBS_SPOOL_DIR', os.path.join(tempfile.gettempdir(), 'fill_invoice_jobs')),
+                    max(1, int(os.environ.get('JOBS_WORKERS', 2))),
+                    max(1, int(os.environ.get('JOBS_MAX_PENDING', 16))),
+                    int(os.environ.get('JOBS_TTL', 3600)),
+                )
+    return _queue
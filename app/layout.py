@@ -0,0 +1,87 @@
+from collections import namedtuple
+
+# Posición de una imagen en el PDF: coordenadas de la esquina inferior
+# izquierda en puntos, como las usa el PDF
+Placement = namedtuple('Placement', ['key', 'x', 'y', 'width', 'height'])
+
+
+class _Shelf:
+    def __init__(self, top, height):
+        self.top = top
+        self.height = height
+        self.used_width = 0
+        self.items = []
+
+
+class _Page:
+    def __init__(self, top):
+        self.free_top = top
+        self.shelves = []
+
+
+def shelf_pack(items, page_width, page_height, margin, spacing, min_scale=0.8):
+    """
+    Diagrama imágenes en páginas con el algoritmo de estantes FFDH (First Fit
+    Decreasing Height).
+
+    items: lista de (llave, ancho, alto) en puntos.
+    Las imágenes se ordenan por alto descendente (lo que agrupa las de
+    proporción parecida) y cada una va al primer estante, de cualquier
+    página, donde quepa; si no cabe en ninguno se abre un estante nuevo en
+    la primera página con espacio vertical, o una página nueva. Una imagen
+    puede reducirse hasta min_scale para caber en el espacio que queda.
+
+    Retorna una lista de páginas; cada página es una lista de Placement.
+    """
+    usable_width = page_width - 2 * margin
+    usable_height = page_height - 2 * margin
+    top = page_height - margin
+    pages = []
+
+    def fit_scale(width, height, free_width, free_height):
+        scale = min(1.0, free_width / width, free_height / height)
+        return scale if scale >= min_scale else None
+
+    ordered = sorted(enumerate(items), key=lambda entry: (-entry[1][2], entry[0]))
+    for _, (key, width, height) in ordered:
+        # Las imágenes más grandes que la página se reducen sin límite
+        if width > usable_width or height > usable_height:
+            scale = min(usable_width / width, usable_height / height)
+            width, height = width * scale, height * scale
+
+        placed = False
+        for page in pages:
+            for shelf in page.shelves:
+                gap = spacing if shelf.items else 0
+                scale = fit_scale(width, height, usable_width - shelf.used_width - gap, shelf.height)
+                if scale is None:
+                    continue
+                w, h = width * scale, height * scale
+                x = margin + shelf.used_width + gap
+                shelf.items.append(Placement(key, x, shelf.top - h, w, h))
+                shelf.used_width += gap + w
+                placed = True
+                break
+            if placed:
+                break
+        if placed:
+            continue
+
+        for page in pages:
+            gap = spacing if page.shelves else 0
+            scale = fit_scale(width, height, usable_width, page.free_top - gap - margin)
+            if scale is not None:
+                break
+        else:
+            page = _Page(top)
+            pages.append(page)
+            gap, scale = 0, 1.0
+
+        w, h = width * scale, height * scale
+        shelf = _Shelf(page.free_top - gap, h)
+        shelf.items.append(Placement(key, margin, shelf.top - h, w, h))
+        shelf.used_width = w
+        page.shelves.append(shelf)
+        page.free_top = shelf.top - h
+
+    return [[item for shelf in page.shelves for item in shelf.items] for page in pages]
@@ -0,0 +1,151 @@
+import os
+import time
+import bisect
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+# Límites (segundos) de los buckets de los histogramas de etapas
+STAGE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Cabecera que activa el perfil por petición (ver RequestProfile)
+PROFILE_HEADER = 'X-Profile'
+
+
+class Histogram:
+    """Histograma acumulado con buckets fijos, al estilo de Prometheus"""
+
+    def __init__(self, buckets=STAGE_BUCKETS):
+        self.buckets = buckets
+        self._counts = [0] * (len(buckets) + 1)
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    def snapshot(self):
+        """Retorna (conteos acumulados por bucket, incluido +Inf; suma; conteo)"""
+        with self._lock:
+            counts = list(self._counts)
+            total = self._sum
+        cumulative = []
+        running = 0
+        for count in counts:
+            running += count
+            cumulative.append(running)
+        return cumulative, total, running
+
+
+class RequestProfile:
+    """Tiempos acumulados por etapa de una sola petición (cabecera X-Profile)"""
+
+    def __init__(self):
+        self._stages = {}
+        self._lock = threading.Lock()
+
+    def add(self, name, seconds):
+        with self._lock:
+            count, total = self._stages.get(name, (0, 0.0))
+            self._stages[name] = (count + 1, total + seconds)
+
+    def stages(self):
+        """{etapa: (veces, segundos en total)}"""
+        with self._lock:
+            return dict(self._stages)
+
+    def server_timing(self):
+        """Valor de la cabecera Server-Timing con la duración total de cada etapa"""
+        return ', '.join(f'{name};dur={total * 1000:.2f};desc="x{count}"'
+                         for name, (count, total) in sorted(self.stages().items()))
+
+
+_histograms = {}
+_histograms_lock = threading.Lock()
+_profile = contextvars.ContextVar('request_profile', default=None)
+_enabled = os.environ.get('METRICS', '1') != '0'
+
+
+def _histogram(name):
+    histogram = _histograms.get(name)
+    if histogram is None:
+        with _histograms_lock:
+            histogram = _histograms.setdefault(name, Histogram())
+    return histogram
+
+
+def observe(name, seconds):
+    """Registra la duración de una etapa en su histograma y en el perfil de la petición"""
+    if _enabled:
+        _histogram(name).observe(seconds)
+    profile = _profile.get()
+    if profile is not None:
+        profile.add(name, seconds)
+
+
+class stage:
+    """
+    Mide la duración de un bloque como una etapa con nombre:
+
+        with stage('excel_save'):
+            wb.save(buffer)
+    """
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        observe(self.name, time.perf_counter() - self.start)
+        return False
+
+
+def start_profile():
+    """
+    Activa un perfil para el contexto actual (la petición). Retorna
+    (perfil, token); el token se pasa a stop_profile al terminar.
+    """
+    profile = RequestProfile()
+    return profile, _profile.set(profile)
+
+
+def stop_profile(token):
+    _profile.reset(token)
+
+
+def submit(executor, fn, *args):
+    """
+    executor.submit que, en pools de hilos, corre fn en el contexto actual
+    para que sus etapas cuenten en el perfil de la petición. En pools de
+    procesos las etapas quedan en los histogramas del proceso hijo.
+    """
+    if isinstance(executor, ThreadPoolExecutor):
+        return executor.submit(contextvars.copy_context().run, fn, *args)
+    return executor.submit(fn, *args)
+
+
+def render_prometheus(prefix='fill_invoice'):
+    """
+    Histogramas de etapas en el formato de texto de Prometheus. Los valores
+    son del proceso (worker) que atiende la petición.
+    """
+    name = f'{prefix}_stage_seconds'
+    lines = [f'# HELP {name} Duración de cada etapa del procesamiento, en segundos',
+             f'# TYPE {name} histogram']
+    with _histograms_lock:
+        histograms = sorted(_histograms.items())
+    for stage_name, histogram in histograms:
+        cumulative, total, count = histogram.snapshot()
+        for bound, value in zip(histogram.buckets, cumulative):
+            lines.append(f'{name}_bucket{{stage="{stage_name}",le="{bound:g}"}} {value}')
+        lines.append(f'{name}_bucket{{stage="{stage_name}",le="+Inf"}} {cumulative[-1]}')
+        lines.append(f'{name}_sum{{stage="{stage_name}"}} {total:.6f}')
+        lines.append(f'{name}_count{{stage="{stage_name}"}} {count}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,176 @@
+import io
+import math
+import cv2
+import numpy as np
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase.pdfutils import readJPEGInfo
+
+
+def jpeg_info(jpeg_data):
+    """Retorna (ancho, alto, componentes) leyendo solo la cabecera del JPEG"""
+    width, height, components, _ = readJPEGInfo(io.BytesIO(jpeg_data))
+    return width, height, components
+
+
+def fit_jpeg_to_box(jpeg_data, info, box_width, box_height, dpi, quality):
+    """
+    Reduce un JPEG al número de píxeles que necesita una caja de
+    box_width x box_height puntos a `dpi` y lo re-codifica con la calidad
+    JPEG dada. Si la imagen ya es igual o más pequeña se retorna intacta.
+    Retorna (jpeg, (ancho, alto, componentes)).
+    """
+    px_width, px_height, components = info
+    target_width = max(1, math.ceil(box_width / 72 * dpi))
+    target_height = max(1, math.ceil(box_height / 72 * dpi))
+    if px_width <= target_width and px_height <= target_height:
+        return jpeg_data, info
+
+    # Decodificar ya reducido (1/2, 1/4, 1/8) cuando el JPEG es mucho mayor
+    factor = min(px_width / target_width, px_height / target_height)
+    gray = components == 1
+    flags = cv2.IMREAD_GRAYSCALE if gray else cv2.IMREAD_COLOR
+    for reduction, reduced_gray, reduced_color in ((8, cv2.IMREAD_REDUCED_GRAYSCALE_8, cv2.IMREAD_REDUCED_COLOR_8),
+                                                   (4, cv2.IMREAD_REDUCED_GRAYSCALE_4, cv2.IMREAD_REDUCED_COLOR_4),
+                                                   (2, cv2.IMREAD_REDUCED_GRAYSCALE_2, cv2.IMREAD_REDUCED_COLOR_2)):
+        if factor >= reduction:
+            flags = reduced_gray if gray else reduced_color
+            break
+    image = cv2.imdecode(np.frombuffer(jpeg_data, np.uint8), flags)
+    if image is None:
+        return jpeg_data, info
+
+    image = cv2.resize(image, (target_width, target_height), interpolation=cv2.INTER_AREA)
+    ok, buffer = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, int(quality)])
+    if not ok:
+        return jpeg_data, info
+    return buffer.tobytes(), (target_width, target_height, 1 if gray else 3)
+
+
+class StreamingPDFWriter:
+    """
+    Escribe un PDF de imágenes JPEG de forma incremental sobre un archivo.
+
+    Cada imagen se escribe al archivo apenas se dibuja (DCTDecode, sin
+    re-codificar) y cada página al cerrarse, así que en memoria solo quedan
+    los offsets de los objetos. La salida es determinista (sin fechas).
+    """
+
+    _CATALOG_ID = 1
+    _PAGES_ID = 2
+
+    def __init__(self, fileobj, pagesize=A4):
+        self.fileobj = fileobj
+        self.pagesize = pagesize
+        self._offsets = {}
+        self._next_id = 3
+        self._page_ids = []
+        self._ops = []
+        self._images = {}
+        self._uses_font = False
+        self._position = 0
+        self._write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+
+    def _write(self, data):
+        self.fileobj.write(data)
+        self._position += len(data)
+
+    def _new_id(self):
+        obj_id = self._next_id
+        self._next_id += 1
+        return obj_id
+
+    def _write_object(self, obj_id, body, stream=None):
+        self._offsets[obj_id] = self._position
+        self._write(b'%d 0 obj\n' % obj_id + body)
+        if stream is not None:
+            self._write(b'\nstream\n')
+            self._write(stream)
+            self._write(b'\nendstream')
+        self._write(b'\nendobj\n')
+
+    def add_jpeg(self, jpeg_data, info=None):
+        """
+        Escribe un JPEG como objeto de imagen y retorna su referencia, para
+        dibujarlo después con draw_image en cualquier página.
+        info: (ancho, alto, componentes) si ya se conocen.
+        """
+        px_width, px_height, components = info or jpeg_info(jpeg_data)
+        color_space = {1: b'/DeviceGray', 3: b'/DeviceRGB'}.get(components, b'/DeviceCMYK')
+        obj_id = self._new_id()
+        decode = b' /Decode [1 0 1 0 1 0 1 0]' if components == 4 else b''
+        self._write_object(
+            obj_id,
+            b'<< /Type /XObject /Subtype /Image /Width %d /Height %d /ColorSpace %s '
+            b'/BitsPerComponent 8 /Filter /DCTDecode%s /Length %d >>'
+            % (px_width, px_height, color_space, decode, len(jpeg_data)),
+            jpeg_data,
+        )
+        return obj_id
+
+    def draw_image(self, image_ref, x, y, width, height):
+        """Dibuja en la página actual una imagen ya escrita con add_jpeg"""
+        name = b'Im%d' % image_ref
+        self._images[name] = image_ref
+        self._ops.append(b'q %.4f 0 0 %.4f %.4f %.4f cm /%s Do Q'
+                         % (width, height, x, y, name))
+
+    def draw_jpeg(self, jpeg_data, x, y, width, height, info=None):
+        """
+        Dibuja un JPEG en la página actual en (x, y) con el tamaño dado (puntos).
+        info: (ancho, alto, componentes) si ya se conocen.
+        """
+        self.draw_image(self.add_jpeg(jpeg_data, info), x, y, width, height)
+
+    def draw_label(self, x, y, text, size=7):
+        """
+        Escribe un texto corto (Helvetica) con fondo blanco; (x, y) es la
+        esquina superior izquierda de la etiqueta.
+        """
+        escaped = text.encode('latin-1', 'replace').replace(b'\\', b'\\\\') \
+            .replace(b'(', b'\\(').replace(b')', b'\\)')
+        box_width = size * 0.6 * len(text) + 4
+        box_height = size + 3
+        self._ops.append(b'q 1 g %.4f %.4f %.4f %.4f re f 0 g BT /F1 %d Tf %.4f %.4f Td (%s) Tj ET Q'
+                         % (x, y - box_height, box_width, box_height, size, x + 2, y - size, escaped))
+        self._uses_font = True
+
+    def show_page(self):
+        """Cierra la página actual y la escribe en el archivo"""
+        content = b'\n'.join(self._ops)
+        content_id = self._new_id()
+        self._write_object(content_id, b'<< /Length %d >>' % len(content), content)
+
+        xobjects = b' '.join(b'/%s %d 0 R' % (name, obj_id) for name, obj_id in self._images.items())
+        fonts = (b' /Font << /F1 << /Type /Font /Subtype /Type1 /BaseFont /Helvetica '
+                 b'/Encoding /WinAnsiEncoding >> >>') if self._uses_font else b''
+        page_id = self._new_id()
+        self._write_object(
+            page_id,
+            b'<< /Type /Page /Parent %d 0 R /MediaBox [0 0 %.4f %.4f] /Contents %d 0 R '
+            b'/Resources << /XObject << %s >>%s >> >>'
+            % (self._PAGES_ID, self.pagesize[0], self.pagesize[1], content_id, xobjects, fonts),
+        )
+        self._page_ids.append(page_id)
+        self._ops = []
+        self._images = {}
+        self._uses_font = False
+
+    def save(self):
+        """Cierra la última página y escribe el árbol de páginas, xref y trailer"""
+        if self._ops or not self._page_ids:
+            self.show_page()
+
+        kids = b' '.join(b'%d 0 R' % page_id for page_id in self._page_ids)
+        self._write_object(self._PAGES_ID,
+                           b'<< /Type /Pages /Kids [%s] /Count %d >>' % (kids, len(self._page_ids)))
+        self._write_object(self._CATALOG_ID, b'<< /Type /Catalog /Pages %d 0 R >>' % self._PAGES_ID)
+
+        xref_position = self._position
+        size = self._next_id
+        lines = [b'xref\n0 %d\n' % size, b'0000000000 65535 f \n']
+        for obj_id in range(1, size):
+            lines.append(b'%010d 00000 n \n' % self._offsets[obj_id])
+        self._write(b''.join(lines))
+        self._write(b'trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n'
+                    % (size, self._CATALOG_ID, xref_position))
+        self.fileobj.flush()
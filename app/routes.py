@@ -1,87 +1,388 @@
-from flask import Blueprint, request, send_file, jsonify
-from .service import fill_excel_template, generate_invoice_pdf, generate_exportable_excel
-import requests
-from io import BytesIO
+import time
+import unicodedata
+from urllib.parse import quote
+from flask import Blueprint, request, send_file, jsonify, Response, stream_with_context, current_app, url_for, g
+from .service import (
+    fill_excel_template, fill_excel_templates_zip, generate_invoice_pdf_from_urls, generate_exportable_excel,
+    generate_exportable_csv, generate_exportable_columnar, EXPORTABLE_FORMATS, liquidar_viajes,
+    get_template_spec
+)
+from .downloader import DownloadError
+from .ingest import NDJSON_MIMETYPES, InvalidRowError, read_ndjson_exportable, spool_rows
+from .image_cache import get_image_cache
+from .jobs import get_job_queue, JobQueueFull, DONE
+from .admission import get_admission_controller, AdmissionRejected, LimitExceeded
+from .metrics import PROFILE_HEADER, start_profile, stop_profile, render_prometheus
 
 main = Blueprint('main', __name__)
 
+@main.before_request
+def _start_request_profile():
+    """Con la cabecera X-Profile: 1 se miden las etapas de esta petición"""
+    if request.headers.get(PROFILE_HEADER, '').lower() in ('1', 'true'):
+        g.profile, g.profile_token = start_profile()
+        g.profile_start = time.perf_counter()
+
+@main.after_request
+def _add_server_timing(response):
+    """
+    Agrega la cabecera Server-Timing con el tiempo total de cada etapa
+    medida durante la petición (en respuestas en streaming solo cuenta lo
+    hecho antes de empezar a enviar).
+    """
+    profile = g.pop('profile', None)
+    if profile is not None:
+        stop_profile(g.pop('profile_token'))
+        total = (time.perf_counter() - g.pop('profile_start')) * 1000
+        timing = profile.server_timing()
+        response.headers['Server-Timing'] = f"total;dur={total:.2f}" + (f", {timing}" if timing else "")
+    return response
+
+def _disposition():
+    """
+    'attachment' (por defecto) o 'inline', según DOWNLOAD_DISPOSITION de la
+    app (ver create_app)
+    """
+    return current_app.config.get('DOWNLOAD_DISPOSITION', 'attachment')
+
+def _send_download(buffer, filename, mimetype):
+    """Envía un archivo generado (BytesIO o archivo temporal) por partes, sin copiarlo"""
+    return send_file(
+        buffer,
+        as_attachment=_disposition() == 'attachment',
+        download_name=filename,
+        mimetype=mimetype
+    )
+
+def _send_stream(chunks, filename, mimetype):
+    """
+    Envía en streaming un archivo que se genera por partes. Content-Disposition
+    se arma como en send_file: el nombre va entre comillas si hace falta y,
+    si no es ASCII, también como filename* (RFC 5987). Si la generación
+    falla a mitad de la respuesta, el error se registra y se vuelve a lanzar
+    para que el servidor corte la conexión: el cliente recibe una respuesta
+    incompleta en vez de un archivo que parece completo.
+    """
+    def logged(chunks):
+        try:
+            yield from chunks
+        except Exception:
+            current_app.logger.exception("Falló la generación de %s a mitad de la respuesta", filename)
+            raise
+
+    response = Response(stream_with_context(logged(chunks)), mimetype=mimetype)
+    try:
+        filename.encode('ascii')
+        names = {'filename': filename}
+    except UnicodeEncodeError:
+        simple = unicodedata.normalize('NFKD', filename).encode('ascii', 'ignore').decode('ascii')
+        names = {'filename': simple, 'filename*': "UTF-8''" + quote(filename, safe="!#$&+-.^_`|~")}
+    response.headers.set('Content-Disposition', _disposition(), **names)
+    return response
+
 @main.route('/fill-invoice', methods=['POST'])
 def fill_invoice():
+    """
+    Llena la plantilla con un viaje. La variante de formulario se elige con
+    ?template= (o la clave 'template' del payload; ver template_registry).
+    """
     data = request.json
     try:
-        excel_buffer = fill_excel_template(data)
-        return send_file(
+        excel_buffer = fill_excel_template(data, request.args.get('template'))
+        return _send_download(
             excel_buffer,
-            as_attachment=True,
-            download_name="gastos_viaje_filled.xlsx",
-            mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+            "gastos_viaje_filled.xlsx",
+            "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
         )
     except Exception as e:
         return jsonify({"error": str(e)}), 400
 
+@main.route('/fill-invoices-batch', methods=['POST'])
+def fill_invoices_batch():
+    """
+    Llena la plantilla para una lista de viajes y retorna un ZIP en streaming.
+    Acepta una lista de payloads o un objeto con la clave 'viajes'; la
+    plantilla se elige con ?template= o la clave 'template' del objeto.
+    """
+    data = request.json
+    viajes = data.get('viajes') if isinstance(data, dict) else data
+    template = request.args.get('template') or (data.get('template') if isinstance(data, dict) else None)
+    if not isinstance(viajes, list) or not viajes:
+        return jsonify({"error": "Se requiere una lista de viajes no vacía"}), 400
+    if not all(isinstance(viaje, dict) for viaje in viajes):
+        return jsonify({"error": "Cada viaje debe ser un objeto"}), 400
+    try:
+        get_template_spec(template)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    return _send_stream(fill_excel_templates_zip(viajes, template=template), "gastos_viaje_lote.zip",
+                        "application/zip")
+
+@main.route('/preview-totals', methods=['POST'])
+def preview_totals():
+    """
+    Calcula los totales de la liquidación (los mismos que se escriben en la
+    plantilla) sin generar el Excel. Acepta un viaje, una lista de viajes o
+    un objeto con la clave 'viajes'; retorna las cifras de cada viaje y las
+    sumas, en pesos.
+    """
+    data = request.json
+    if isinstance(data, dict):
+        viajes = data['viajes'] if 'viajes' in data else [data]
+    else:
+        viajes = data
+    if not isinstance(viajes, list):
+        return jsonify({"error": "Se requiere un viaje o una lista de viajes"}), 400
+
+    try:
+        liquidacion = liquidar_viajes(viajes)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({
+        "cantidad": len(liquidacion),
+        "viajes": liquidacion.viajes(),
+        "totales": liquidacion.sumas()
+    })
+
+def _image_urls_from_request():
+    """Retorna (image_urls, None) o (None, respuesta de error) según el payload"""
+    data = request.json
+    if not data or 'image_urls' not in data:
+        return None, (jsonify({"error": "No se encontraron URLs de imágenes"}), 400)
+    
+    image_urls = data['image_urls']
+    if not image_urls:
+        return None, (jsonify({"error": "La lista de URLs está vacía"}), 400)
+    return image_urls, None
+
 @main.route('/generate-invoice-pdf', methods=['POST'])
 def generate_pdf():
     try:
-        data = request.json
-        if not data or 'image_urls' not in data:
-            return jsonify({"error": "No se encontraron URLs de imágenes"}), 400
-        
-        image_urls = data['image_urls']
-        if not image_urls:
-            return jsonify({"error": "La lista de URLs está vacía"}), 400
+        image_urls, error = _image_urls_from_request()
+        if error:
+            return error
 
-        # Descargar las imágenes desde las URLs
-        images_data = []
-        for url in image_urls:
-            try:
-                response = requests.get(url)
-                response.raise_for_status()  # Verifica si hay errores en la respuesta
-                images_data.append(response.content)
-            except requests.RequestException as e:
-                return jsonify({"error": f"Error al descargar imagen desde {url}: {str(e)}"}), 400
-        
-        # Generar el PDF
-        pdf_buffer = generate_invoice_pdf(images_data)
+        # Descargar (concurrentemente) y procesar las imágenes, y generar el
+        # PDF, con un cupo de procesamiento y dentro de los límites de la
+        # petición (ver admission)
+        try:
+            with get_admission_controller().admit(len(image_urls)):
+                pdf_buffer = generate_invoice_pdf_from_urls(image_urls)
+        except DownloadError as e:
+            return jsonify({"error": str(e)}), 400
         
-        return send_file(
-            pdf_buffer,
-            as_attachment=True,
-            download_name="facturas.pdf",
-            mimetype="application/pdf"
-        )
+        return _send_download(pdf_buffer, "facturas.pdf", "application/pdf")
+    except AdmissionRejected as e:
+        return _too_many_requests(e)
+    except LimitExceeded as e:
+        return jsonify({"error": str(e)}), e.status
     except Exception as e:
         return jsonify({"error": str(e)}), 400
 
-@main.route('/generate-exportable-excel', methods=['POST'])
-def generate_exportable_excel_route():
+@main.route('/metrics', methods=['GET'])
+def metrics():
     """
-    Endpoint para generar Excel contable desde datos del modelo Exportable
+    Histogramas de duración por etapa (formato de texto de Prometheus) del
+    worker que atiende la petición
     """
-    try:
+    return Response(render_prometheus(), mimetype="text/plain; version=0.0.4; charset=utf-8")
+
+@main.route('/admission/stats', methods=['GET'])
+def admission_stats():
+    """
+    Límites por petición del control de admisión y ocupación actual de los
+    cupos de procesamiento de imágenes (en uso, esperando, admitidas y
+    rechazadas)
+    """
+    return jsonify(get_admission_controller().stats())
+
+@main.route('/image-cache/stats', methods=['GET'])
+def image_cache_stats():
+    """
+    Contadores de aciertos y fallos de la caché de imágenes procesadas
+    """
+    cache = get_image_cache()
+    if cache is None:
+        return jsonify({"enabled": False})
+    return jsonify(dict(cache.stats(), enabled=True))
+
+def _exportable_from_request():
+    """
+    Lee el payload del exportable: JSON o, con Content-Type
+    application/x-ndjson, por líneas (ver ingest.read_ndjson_exportable).
+    Retorna (data, None), con 'format' y 'filename' (con extensión) ya
+    resueltos, o (None, respuesta de error).
+    """
+    if request.mimetype in NDJSON_MIMETYPES:
+        # Filas leídas del stream a medida que se escriben (cada fila se valida)
+        data = read_ndjson_exportable(request.stream)
+    else:
         data = request.json
         if not data:
-            return jsonify({"error": "No se encontraron datos"}), 400
+            return None, (jsonify({"error": "No se encontraron datos"}), 400)
         
         # Validar que tenga la estructura esperada
         required_fields = ['data']
         if not all(field in data for field in required_fields):
-            return jsonify({"error": "Estructura de datos inválida. Se requiere: data"}), 400
+            return None, (jsonify({"error": "Estructura de datos inválida. Se requiere: data"}), 400)
         
         # Validar que data sea una lista
         if not isinstance(data.get('data'), list):
-            return jsonify({"error": "El campo 'data' debe ser una lista"}), 400
+            return None, (jsonify({"error": "El campo 'data' debe ser una lista"}), 400)
+        if not all(isinstance(row, dict) for row in data['data']):
+            return None, (jsonify({"error": "Cada fila de 'data' debe ser un objeto"}), 400)
+    
+    fmt = data.get('format', 'xlsx')
+    if not isinstance(fmt, str):
+        return None, (jsonify({"error": "El campo 'format' debe ser un texto"}), 400)
+    if fmt not in EXPORTABLE_FORMATS:
+        return None, (jsonify({"error": f"Formato no soportado: {fmt}"}), 400)
+    extension, _ = EXPORTABLE_FORMATS[fmt]
+    
+    filename = data.get('filename', 'exportable_contable')
+    if not isinstance(filename, str):
+        return None, (jsonify({"error": "El campo 'filename' debe ser un texto"}), 400)
+    if not filename.endswith(extension):
+        filename += extension
+    data['format'], data['filename'] = fmt, filename
+    return data, None
+
+@main.route('/generate-exportable-excel', methods=['POST'])
+def generate_exportable_excel_route():
+    """
+    Endpoint para generar Excel contable desde datos del modelo Exportable.
+    El campo opcional 'format' permite 'xlsx' (por defecto), 'csv' (en
+    streaming), 'parquet' o 'arrow' (si pyarrow está instalado).
+    Con Content-Type application/x-ndjson el cuerpo se lee por líneas (ver
+    ingest.read_ndjson_exportable) y las filas pasan directo al escritor.
+    """
+    try:
+        data, error = _exportable_from_request()
+        if error:
+            return error
+        fmt, filename = data['format'], data['filename']
+        mimetype = EXPORTABLE_FORMATS[fmt][1]
         
-        excel_buffer = generate_exportable_excel(data)
+        if fmt == 'csv':
+            # Las filas se envían a medida que se generan; las de un cuerpo
+            # NDJSON se validan todas antes, porque una vez empezada la
+            # respuesta un error ya no puede ser un 400
+            if not isinstance(data['data'], list):
+                data['data'] = spool_rows(data['data'])
+            return _send_stream(generate_exportable_csv(data), filename, mimetype)
         
-        filename = data.get('filename', 'exportable_contable')
-        if not filename.endswith('.xlsx'):
-            filename += '.xlsx'
+        if fmt == 'xlsx':
+            excel_buffer = generate_exportable_excel(data)
+        else:
+            try:
+                excel_buffer = generate_exportable_columnar(data, fmt)
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
         
-        return send_file(
-            excel_buffer,
-            as_attachment=True,
-            download_name=filename,
-            mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-        )
+        return _send_download(excel_buffer, filename, mimetype)
+    except InvalidRowError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
\ No newline at end of file
+        return jsonify({"error": str(e)}), 500
+
+def _admitted_invoice_pdf(image_urls):
+    """
+    PDF de facturas para la cola de trabajos: espera su cupo de
+    procesamiento sin límite de tiempo (ya está encolado) y aplica los
+    límites de la petición, con el tiempo máximo de los trabajos (ver
+    admission)
+    """
+    controller = get_admission_controller()
+    with controller.admit(len(image_urls), timeout=None, max_seconds=controller.limits.job_max_seconds):
+        return generate_invoice_pdf_from_urls(image_urls)
+
+def _render_exportable(data):
+    """Genera el exportable en el formato pedido (para la cola de trabajos)"""
+    fmt = data['format']
+    if fmt == 'csv':
+        return generate_exportable_csv(data)
+    if fmt == 'xlsx':
+        return generate_exportable_excel(data)
+    return generate_exportable_columnar(data, fmt)
+
+def _job_response(job):
+    """Respuesta 202 con el id del trabajo y las URLs de estado y descarga"""
+    status_url = url_for('main.job_status', job_id=job['job_id'])
+    response = jsonify({
+        "job_id": job['job_id'],
+        "status": job['status'],
+        "status_url": status_url,
+        "download_url": url_for('main.job_download', job_id=job['job_id'])
+    })
+    response.status_code = 202
+    response.headers['Location'] = status_url
+    return response
+
+def _too_many_requests(error):
+    """429 con Retry-After cuando la cola de trabajos o el procesamiento de imágenes no tienen cupo"""
+    response = jsonify({"error": str(error)})
+    response.status_code = 429
+    response.headers['Retry-After'] = '5'
+    return response
+
+@main.route('/jobs/invoice-pdf', methods=['POST'])
+def submit_invoice_pdf_job():
+    """
+    Versión asíncrona de /generate-invoice-pdf: encola el trabajo y responde
+    de inmediato con su id (202). El PDF se descarga de /jobs/<id>/download.
+    """
+    image_urls, error = _image_urls_from_request()
+    if error:
+        return error
+    try:
+        get_admission_controller().check_count(len(image_urls))
+    except LimitExceeded as e:
+        return jsonify({"error": str(e)}), e.status
+    try:
+        job = get_job_queue().submit('invoice-pdf', _admitted_invoice_pdf, (image_urls,),
+                                     "facturas.pdf", "application/pdf")
+    except JobQueueFull as e:
+        return _too_many_requests(e)
+    return _job_response(job)
+
+@main.route('/jobs/exportable', methods=['POST'])
+def submit_exportable_job():
+    """
+    Versión asíncrona de /generate-exportable-excel (mismo payload y
+    formatos). Un cuerpo NDJSON se lee completo antes de encolar el trabajo.
+    """
+    try:
+        data, error = _exportable_from_request()
+        if error:
+            return error
+        # Las filas deben leerse mientras la petición está abierta
+        data['data'] = list(data['data'])
+    except InvalidRowError as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        job = get_job_queue().submit('exportable', _render_exportable, (data,), data['filename'],
+                                     EXPORTABLE_FORMATS[data['format']][1])
+    except JobQueueFull as e:
+        return _too_many_requests(e)
+    return _job_response(job)
+
+@main.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    """Estado del trabajo: queued, running, done o failed (con el error)"""
+    job = get_job_queue().status(job_id)
+    if job is None:
+        return jsonify({"error": "Trabajo no encontrado o expirado"}), 404
+    return jsonify(job)
+
+@main.route('/jobs/<job_id>/download', methods=['GET'])
+def job_download(job_id):
+    """Descarga el resultado de un trabajo terminado"""
+    queue = get_job_queue()
+    job = queue.status(job_id)
+    if job is None:
+        return jsonify({"error": "Trabajo no encontrado o expirado"}), 404
+    if job['status'] != DONE:
+        return jsonify({"error": f"El trabajo no ha terminado (estado: {job['status']})",
+                        "status": job['status']}), 409
+    return _send_download(queue.result_path(job_id), job['filename'], job['mimetype'])
@@ -0,0 +1,190 @@
+from decimal import Decimal, InvalidOperation
+
+# Conceptos de gasto de un viaje (mismas claves y orden que GASTOS_MAPPING
+# de la plantilla). 'bonificacion' cuenta como gasto y también suma al
+# valor del viaje.
+GASTOS_CLAVES = ('acpm', 'cargue', 'descargue', 'peajes', 'comision_empresa', 'llantas', 'engrase',
+                 'lavada', 'parqueadero', 'carrosada', 'descarrrosada', 'otros', 'bonificacion')
+
+# Cifras de la liquidación, en el orden del resumen de la plantilla
+LIQUIDACION_CAMPOS = ('valor_viaje', 'total_gastos', 'menos_anticipo', 'saldo_a_favor', 'saldo_en_contra')
+
+# Valor absoluto máximo aceptado (pesos); mantiene los centavos dentro de int64
+MAX_VALOR = 10 ** 15
+
+
+class SettlementError(ValueError):
+    """
+    Un valor de un viaje no es un monto válido. indice es la posición del
+    viaje en el lote, o None cuando se liquida un solo viaje (ver
+    liquidar_viaje) y el mensaje no lo menciona.
+    """
+
+    def __init__(self, indice, campo, valor, motivo="no es un monto numérico"):
+        self.indice = indice
+        self.campo = campo
+        self.valor = valor
+        self.motivo = motivo
+        detalle = f"{valor!r} {motivo}"
+        if indice is None:
+            super().__init__(f"Campo '{campo}': {detalle}")
+        else:
+            super().__init__(f"Viaje {indice + 1}, campo '{campo}': {detalle}")
+
+
+def _centavos_lentos(valores, campo):
+    """Convierte valor por valor con Decimal (textos, mezclas de tipos); valida cada uno"""
+    import numpy as np
+
+    centavos = np.empty(len(valores), dtype=np.int64)
+    for i, valor in enumerate(valores):
+        if isinstance(valor, bool) or not isinstance(valor, (int, float, str, Decimal)):
+            raise SettlementError(i, campo, valor)
+        try:
+            monto = Decimal(valor.strip() if isinstance(valor, str) else str(valor))
+        except InvalidOperation:
+            raise SettlementError(i, campo, valor)
+        if not monto.is_finite():
+            raise SettlementError(i, campo, valor)
+        if abs(monto) >= MAX_VALOR:
+            raise SettlementError(i, campo, valor, "excede el valor máximo")
+        centavos[i] = int((monto * 100).to_integral_value())
+    return centavos
+
+
+def a_centavos(valores, campo):
+    """
+    Convierte una columna de montos en pesos (int, float, texto numérico,
+    Decimal; None o '' valen 0) a centavos exactos en un array int64.
+    Las columnas de solo enteros o solo floats se convierten vectorizadas;
+    los floats se redondean al centavo. Lanza SettlementError con el viaje
+    y el campo del primer valor inválido.
+    """
+    import numpy as np
+
+    if not (isinstance(valores, np.ndarray) and valores.dtype.kind in 'iuf'):
+        valores = [valor if valor is not None and not (isinstance(valor, str) and valor == '') else 0
+                   for valor in valores]
+        # NumPy convierte True/False a 1/0 si se mezclan con números; la ruta
+        # lenta los rechaza con el índice del viaje
+        if any(isinstance(valor, (bool, np.bool_)) for valor in valores):
+            return _centavos_lentos(valores, campo)
+    arr = np.asarray(valores) if len(valores) else np.zeros(0, dtype=np.int64)
+    if arr.ndim != 1:
+        return _centavos_lentos(valores, campo)
+    if arr.dtype.kind in 'iu':
+        if arr.size and np.abs(arr).max() >= MAX_VALOR:
+            return _centavos_lentos(valores, campo)
+        return arr.astype(np.int64) * 100
+    if arr.dtype.kind == 'f':
+        malos = ~np.isfinite(arr) | (np.abs(arr) >= MAX_VALOR)
+        if malos.any():
+            return _centavos_lentos(valores, campo)
+        return np.rint(arr * 100).astype(np.int64)
+    return _centavos_lentos(valores, campo)
+
+
+def columnas_viajes(viajes):
+    """
+    Pasa una lista de payloads de viaje (flete, anticipo, gastos) a columnas:
+    {'flete': [...], 'anticipo': [...], 'gastos': {concepto: [...]}}.
+    """
+    for i, viaje in enumerate(viajes):
+        if not isinstance(viaje, dict):
+            raise SettlementError(i, 'viaje', viaje, "no es un objeto")
+        if not isinstance(viaje.get('gastos') or {}, dict):
+            raise SettlementError(i, 'gastos', viaje.get('gastos'), "no es un objeto")
+    gastos = [viaje.get('gastos') or {} for viaje in viajes]
+    return {
+        'flete': [viaje.get('flete', 0) for viaje in viajes],
+        'anticipo': [viaje.get('anticipo', 0) for viaje in viajes],
+        'gastos': {clave: [g.get(clave, 0) for g in gastos] for clave in GASTOS_CLAVES},
+    }
+
+
+class Liquidacion:
+    """
+    Resultado de liquidar N viajes. Cada cifra de LIQUIDACION_CAMPOS es un
+    array int64 de N valores en centavos (atributos con el mismo nombre).
+    """
+
+    def __init__(self, cifras):
+        self.cifras = cifras
+        for campo, valores in cifras.items():
+            setattr(self, campo, valores)
+
+    def __len__(self):
+        return len(self.valor_viaje)
+
+    def sumas(self):
+        """Suma de cada cifra sobre todos los viajes, en pesos"""
+        return {campo: a_pesos(int(valores.sum())) for campo, valores in self.cifras.items()}
+
+    def viaje(self, i):
+        """Cifras del viaje i, en pesos"""
+        return {campo: a_pesos(int(valores[i])) for campo, valores in self.cifras.items()}
+
+    def filas(self):
+        """Lista de N filas [valor_viaje, ..., saldo_en_contra] en pesos"""
+        columnas = [self.cifras[campo].tolist() for campo in LIQUIDACION_CAMPOS]
+        return [[a_pesos(c) for c in fila] for fila in zip(*columnas)]
+
+    def viajes(self):
+        """Lista de N dicts {cifra: pesos}"""
+        return [dict(zip(LIQUIDACION_CAMPOS, fila)) for fila in self.filas()]
+
+
+def a_pesos(centavos):
+    """Centavos (int) a pesos: int si no hay centavos, float con 2 decimales si los hay"""
+    if centavos % 100 == 0:
+        return centavos // 100
+    return centavos / 100
+
+
+def liquidar(columnas):
+    """
+    Liquida uno o varios viajes dados como columnas (ver columnas_viajes), en
+    una sola pasada vectorizada y con aritmética entera en centavos (exacta):
+
+    - total_gastos = suma de todos los conceptos de gasto (incluye bonificación)
+    - valor_viaje = flete + bonificación
+    - menos_anticipo = anticipo - total_gastos
+    - saldo_a_favor / saldo_en_contra: menos_anticipo si es positivo / su
+      valor absoluto si es negativo (desde la perspectiva de la empresa)
+    """
+    import numpy as np
+
+    flete = a_centavos(columnas['flete'], 'flete')
+    anticipo = a_centavos(columnas['anticipo'], 'anticipo')
+    gastos_columnas = columnas.get('gastos', {})
+    gastos = np.zeros((len(flete), len(GASTOS_CLAVES)), dtype=np.int64)
+    for j, clave in enumerate(GASTOS_CLAVES):
+        valores = gastos_columnas.get(clave)
+        if valores is not None:
+            gastos[:, j] = a_centavos(valores, clave)
+
+    total_gastos = gastos.sum(axis=1)
+    menos_anticipo = anticipo - total_gastos
+    return Liquidacion({
+        'valor_viaje': flete + gastos[:, GASTOS_CLAVES.index('bonificacion')],
+        'total_gastos': total_gastos,
+        'menos_anticipo': menos_anticipo,
+        'saldo_a_favor': np.maximum(menos_anticipo, 0),
+        'saldo_en_contra': np.maximum(-menos_anticipo, 0),
+    })
+
+
+def liquidar_viajes(viajes):
+    """Liquida una lista de payloads de viaje (ver liquidar)"""
+    return liquidar(columnas_viajes(viajes))
+
+
+def liquidar_viaje(viaje):
+    """
+    Liquida un solo viaje (ver liquidar). Los errores no mencionan su
+    posición: quien lo llama (por ejemplo, un lote de archivos) sabe cuál es.
+    """
+    try:
+        return liquidar_viajes([viaje])
+    except SettlementError as e:
+        raise SettlementError(None, e.campo, e.valor, e.motivo) from None
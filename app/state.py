@@ -0,0 +1,54 @@
+import os
+import importlib
+import threading
+
+# Dependencias que los módulos de servicio importan de forma perezosa; en
+# gunicorn se cargan en el maestro para que los workers no las re-importen
+_HEAVY_MODULES = ('numpy', 'cv2', 'PIL.Image', 'imutils.perspective', 'openpyxl',
+                  'reportlab.pdfbase.pdfutils', 'requests')
+
+_warmed_up = False
+_lock = threading.Lock()
+
+
+def warm_up():
+    """
+    Construye una sola vez el estado compartido por proceso: las plantillas
+    registradas precargadas con sus planes de celdas compilados (y los de la
+    ruta rápida, ver xlsx_patch), la caché de imágenes, la sesión HTTP de
+    descargas, el control de admisión (sus contadores quedan compartidos
+    por los workers) y las dependencias pesadas (_HEAVY_MODULES).
+
+    Pensado para llamarse en el proceso maestro de gunicorn antes del fork
+    (ver gunicorn.conf.py): los workers heredan estas páginas de memoria y
+    las comparten copy-on-write. Los pools de hilos/procesos no se crean
+    aquí, porque los hilos no sobreviven al fork; cada worker los crea al
+    primer uso.
+    """
+    global _warmed_up
+    if _warmed_up:
+        return
+    with _lock:
+        if _warmed_up:
+            return
+        from .template_registry import compile_templates, template_names
+        from .xlsx_patch import fast_path_enabled, get_xlsx_patcher
+        from .image_cache import get_image_cache
+        from .downloader import get_session
+        from .admission import get_admission_controller
+
+        for name in _HEAVY_MODULES:
+            importlib.import_module(name)
+        compile_templates()
+        if fast_path_enabled():
+            for name in template_names():
+                get_xlsx_patcher(name)
+        get_image_cache()
+        get_session()
+        get_admission_controller()
+        _warmed_up = True
+
+
+def warm_up_enabled():
+    """El precalentamiento se puede desactivar con WARM_UP=0"""
+    return os.environ.get('WARM_UP', '1') != '0'
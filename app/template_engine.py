@@ -0,0 +1,90 @@
+import os
+import io
+import pickle
+import threading
+from .utils import indice_celdas_fusionadas
+from .metrics import stage
+
+
+class TemplateEngine:
+    """
+    Mantiene en memoria una copia maestra de una plantilla Excel.
+
+    La plantilla se parsea una sola vez por proceso (worker) y se guarda
+    serializada con pickle; cada petición recibe una copia independiente
+    que puede llenar sin afectar a la maestra. Si el archivo cambia en disco
+    (mtime distinto) la plantilla se recarga automáticamente.
+
+    En cada carga también se precalcula, por hoja, el índice de celdas
+    fusionadas para resolver celdas principales sin recorrer los rangos.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        # (snapshot, índices de celdas fusionadas por hoja, mtime)
+        self._state = None
+
+    def _current_mtime(self):
+        return os.stat(self.path).st_mtime_ns
+
+    def _load(self, mtime):
+        from openpyxl import load_workbook
+
+        with stage('template_parse'):
+            with open(self.path, 'rb') as f:
+                wb = load_workbook(io.BytesIO(f.read()))
+            indices = {ws.title: indice_celdas_fusionadas(ws) for ws in wb.worksheets}
+            snapshot = pickle.dumps(wb, protocol=pickle.HIGHEST_PROTOCOL)
+        self._state = (snapshot, indices, mtime)
+
+    def _current_state(self):
+        mtime = self._current_mtime()
+        state = self._state
+        if state is None or state[2] != mtime:
+            with self._lock:
+                state = self._state
+                if state is None or state[2] != mtime:
+                    self._load(mtime)
+                    state = self._state
+        return state
+
+    def snapshot(self):
+        """Retorna la copia maestra serializada, recargándola si el archivo cambió"""
+        return self._current_state()[0]
+
+    def merged_index(self, sheet_name):
+        """Retorna el índice precalculado de celdas fusionadas de una hoja"""
+        return self._current_state()[1][sheet_name]
+
+    def workbook(self):
+        """Retorna un Workbook nuevo, listo para llenar, a partir de la copia maestra"""
+        return pickle.loads(self.snapshot())
+
+    def workbook_with_index(self):
+        """
+        Retorna (workbook, índices) tomados de la misma carga de la plantilla,
+        para que el índice de celdas fusionadas siempre corresponda a la copia.
+        """
+        snapshot, indices, _ = self._current_state()
+        return pickle.loads(snapshot), indices
+
+    def reload(self):
+        """Fuerza la recarga de la plantilla desde disco"""
+        with self._lock:
+            self._load(self._current_mtime())
+
+
+_engines = {}
+_engines_lock = threading.Lock()
+
+
+def get_template_engine(path):
+    """Retorna el motor (único por proceso) asociado a la ruta de plantilla"""
+    engine = _engines.get(path)
+    if engine is None:
+        with _engines_lock:
+            engine = _engines.get(path)
+            if engine is None:
+                engine = _engines[path] = TemplateEngine(path)
+    return engine
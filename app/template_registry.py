@@ -0,0 +1,211 @@
+import os
+import json
+import threading
+from .template_engine import get_template_engine
+from .settlement import GASTOS_CLAVES, LIQUIDACION_CAMPOS
+from .metrics import stage
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'template')
+
+# Plantilla que se usa cuando la petición no pide otra
+DEFAULT_TEMPLATE = 'gastos_viaje'
+
+
+class TemplateSpec:
+    """
+    Declaración de una variante de formulario: archivo .xlsx, hoja (None =
+    la activa) y la celda donde va cada dato:
+
+    - campos: {campo del payload (empresa, placa, flete, ...): celda}
+    - gastos: {concepto de payload['gastos'] (ver GASTOS_CLAVES): celda}
+    - resumen: {cifra de la liquidación (ver LIQUIDACION_CAMPOS): celda}
+
+    Las celdas pueden ser cualquiera dentro de un rango fusionado; al
+    compilar (compile_plan) se resuelven a la celda principal.
+    """
+
+    def __init__(self, name, filename, campos, gastos, resumen, sheet=None):
+        self.name = name
+        self.filename = filename
+        self.campos = dict(campos)
+        self.gastos = dict(gastos)
+        self.resumen = dict(resumen)
+        self.sheet = sheet
+
+    @property
+    def path(self):
+        return os.path.join(TEMPLATE_DIR, self.filename)
+
+    @classmethod
+    def from_dict(cls, name, spec, registry):
+        """
+        Spec leída de TEMPLATE_REGISTRY. Con 'extends' parte de otra plantilla
+        registrada y solo reemplaza lo que declara (archivo, hoja, celdas).
+        """
+        base = registry.get(spec.get('extends', ''))
+        if 'extends' in spec and base is None:
+            raise ValueError(f"Plantilla '{name}': extends '{spec['extends']}' no está registrada")
+        if base is None and 'file' not in spec:
+            raise ValueError(f"Plantilla '{name}': falta 'file'")
+
+        def celdas(seccion):
+            return dict(getattr(base, seccion) if base else {}, **spec.get(seccion, {}))
+
+        return cls(name, spec.get('file', base.filename if base else None),
+                   celdas('campos'), celdas('gastos'), celdas('resumen'),
+                   spec.get('sheet', base.sheet if base else None))
+
+
+# Formulario GASTOS_VIAJE (template/GASTOS_VIAJE.xlsx)
+GASTOS_VIAJE = TemplateSpec(
+    DEFAULT_TEMPLATE, 'GASTOS_VIAJE.xlsx',
+    campos={
+        'empresa': 'E4',
+        'nit': 'E6',
+        'placa': 'B7',
+        'conductor': 'H7',
+        'desde': 'E10',
+        'hasta': 'I10',
+        'fecha': 'B13',
+        'anticipo': 'G14',
+        'flete': 'J14'
+    },
+    gastos={
+        'acpm': 'G16',
+        'cargue': 'G18',
+        'descargue': 'G20',
+        'peajes': 'G22',
+        'comision_empresa': 'G24',
+        'llantas': 'G26',
+        'engrase': 'G28',
+        'lavada': 'G30',
+        'parqueadero': 'G32',
+        'carrosada': 'G34',
+        'descarrrosada': 'G36',
+        'otros': 'G38',
+        'bonificacion': 'G40'
+    },
+    resumen={
+        'valor_viaje': 'I41',
+        'total_gastos': 'I42',
+        'menos_anticipo': 'I43',
+        'saldo_a_favor': 'I44',
+        'saldo_en_contra': 'I45'
+    }
+)
+
+
+class TemplatePlan:
+    """
+    Spec compilada contra su libro: cada dato apunta a la (fila, columna) de
+    su celda principal, con las celdas fusionadas ya resueltas. Llenar una
+    hoja es solo escribir los valores en esas celdas.
+    """
+    __slots__ = ('spec', 'campos', 'gastos', 'resumen')
+
+    def __init__(self, spec, campos, gastos, resumen):
+        self.spec = spec
+        self.campos = campos
+        self.gastos = gastos
+        self.resumen = resumen
+
+    def fill(self, ws, data, totales):
+        """Escribe en la hoja los campos y gastos del viaje y sus totales (ver settlement)"""
+        cell = ws.cell
+        for campo, row, column in self.campos:
+            cell(row, column).value = data.get(campo, '')
+        gastos = data.get('gastos') or {}
+        for clave, row, column in self.gastos:
+            cell(row, column).value = gastos.get(clave, 0)
+        for cifra, row, column in self.resumen:
+            cell(row, column).value = totales[cifra]
+
+
+def compile_plan(spec, indice):
+    """
+    Compila la spec con el índice de celdas fusionadas de su hoja (ver
+    indice_celdas_fusionadas). Valida que gastos y resumen usen conceptos y
+    cifras conocidos.
+    """
+    from openpyxl.utils.cell import coordinate_to_tuple
+
+    desconocidos = (set(spec.gastos) - set(GASTOS_CLAVES)) | (set(spec.resumen) - set(LIQUIDACION_CAMPOS))
+    if desconocidos:
+        raise ValueError(f"Plantilla '{spec.name}': claves desconocidas {sorted(desconocidos)}")
+
+    def resolver(celdas):
+        return tuple((clave, *coordinate_to_tuple(indice.get(celda, celda))) for clave, celda in celdas.items())
+
+    return TemplatePlan(spec, resolver(spec.campos), resolver(spec.gastos), resolver(spec.resumen))
+
+
+_registry = None
+_registry_lock = threading.Lock()
+# nombre -> (índice de celdas fusionadas de la hoja, plan compilado con él)
+_plans = {}
+_plans_lock = threading.Lock()
+
+
+def _load_registry():
+    """
+    Plantillas registradas: GASTOS_VIAJE y las variantes declaradas en el
+    JSON de TEMPLATE_REGISTRY ({nombre: {file, sheet, extends, campos,
+    gastos, resumen}}; los archivos relativos se buscan en template/).
+    """
+    registry = {DEFAULT_TEMPLATE: GASTOS_VIAJE}
+    path = os.environ.get('TEMPLATE_REGISTRY')
+    if path:
+        with open(path, encoding='utf-8') as f:
+            specs = json.load(f)
+        for name, spec in specs.items():
+            registry[name] = TemplateSpec.from_dict(name, spec, registry)
+    return registry
+
+
+def _templates():
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = _load_registry()
+    return _registry
+
+
+def template_names():
+    return list(_templates())
+
+
+def get_template_spec(name=None):
+    """Spec de la plantilla pedida (DEFAULT_TEMPLATE si name es vacío); ValueError si no existe"""
+    templates = _templates()
+    spec = templates.get(name or DEFAULT_TEMPLATE)
+    if spec is None:
+        raise ValueError(f"Plantilla desconocida: {name!r} (disponibles: {', '.join(templates)})")
+    return spec
+
+
+def load_template(name=None):
+    """
+    Retorna (workbook, hoja, plan): una copia de la plantilla pedida (ver
+    TemplateEngine) y su plan compilado. El plan se compila una vez por
+    carga de la plantilla y queda en memoria.
+    """
+    spec = get_template_spec(name)
+    with stage('template_load'):
+        wb, indices = get_template_engine(spec.path).workbook_with_index()
+    ws = wb[spec.sheet] if spec.sheet else wb.active
+    indice = indices[ws.title]
+
+    cached = _plans.get(spec.name)
+    if cached is None or cached[0] is not indice:
+        with _plans_lock:
+            cached = _plans.get(spec.name)
+            if cached is None or cached[0] is not indice:
+                cached = _plans[spec.name] = (indice, compile_plan(spec, indice))
+    return wb, ws, cached[1]
+
+
+def compile_templates():
+    """Carga y compila todas las plantillas registradas (al arrancar, ver state.warm_up)"""
+    for name in template_names():
+        load_template(name)
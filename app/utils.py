@@ -0,0 +1,39 @@
+import os
+
+
+def env_int(name, default):
+    """Entero de la variable de entorno name, o default si no está definida"""
+    return int(os.environ.get(name, default))
+
+
+def env_float(name, default):
+    """Número de la variable de entorno name, o default si no está definida"""
+    return float(os.environ.get(name, default))
+
+
+def indice_celdas_fusionadas(hoja):
+    """
+    Construye un índice {coordenada: coordenada de la celda principal} para
+    todas las celdas que pertenecen a un rango fusionado de la hoja.
+    Se calcula una sola vez por plantilla y permite resolver la celda
+    principal en tiempo constante.
+    """
+    return indice_rangos_fusionados(merged_range.bounds for merged_range in hoja.merged_cells.ranges)
+
+
+def indice_rangos_fusionados(rangos):
+    """
+    Índice de indice_celdas_fusionadas a partir de los límites
+    (min_col, min_row, max_col, max_row) de cada rango fusionado; lo usan
+    la hoja de openpyxl y el XML de la hoja (ver xlsx_patch).
+    """
+    from openpyxl.utils import get_column_letter
+
+    indice = {}
+    for min_col, min_row, max_col, max_row in rangos:
+        principal = f"{get_column_letter(min_col)}{min_row}"
+        for col in range(min_col, max_col + 1):
+            letra = get_column_letter(col)
+            for fila in range(min_row, max_row + 1):
+                indice[f"{letra}{fila}"] = principal
+    return indice
@@ -0,0 +1,246 @@
+import io
+import os
+import re
+import math
+import struct
+import zlib
+import zipfile
+import logging
+import posixpath
+import threading
+from xml.etree import ElementTree
+from .template_registry import get_template_spec, compile_plan
+from .utils import indice_rangos_fusionados
+from .metrics import stage
+
+logger = logging.getLogger(__name__)
+
+_NS = {
+    'main': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main',
+    'rel': 'http://schemas.openxmlformats.org/package/2006/relationships',
+}
+_R_ID = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id'
+
+# Caracteres que openpyxl no acepta en celdas (IllegalCharacterError)
+_ILLEGAL_CHARACTERS = re.compile(r'[\000-\010]|[\013-\014]|[\016-\037]')
+_T_ATTRIBUTE = re.compile(rb'\st="[^"]*"')
+
+_LOCAL_HEADER = struct.Struct('<IHHHHHIIIHH')
+_CENTRAL_HEADER = struct.Struct('<IHHHHHHIIIHHHHHII')
+_END_RECORD = struct.Struct('<IHHHHIIH')
+
+
+class XlsxPatcher:
+    """
+    Ruta rápida para llenar una plantilla sin openpyxl.
+
+    Al construirse lee el .xlsx una vez: guarda las partes del zip que no
+    cambian tal como están (ya comprimidas) y parte el XML de la hoja en
+    los tramos fijos y los elementos <c> de las celdas del plan. Llenar es
+    reemplazar esos <c> (números o cadenas inline, sin tocar
+    sharedStrings.xml), comprimir solo la hoja y escribir el zip reusando
+    los bytes del resto de partes.
+
+    Solo aplica a plantillas cuyas celdas destino existen en la hoja y que
+    no tienen fórmulas (sus valores en caché quedarían desactualizados);
+    si no, el constructor lanza ValueError y se usa openpyxl.
+    """
+
+    def __init__(self, spec):
+        self.spec = spec
+        with open(spec.path, 'rb') as f:
+            data = f.read()
+        with zipfile.ZipFile(io.BytesIO(data)) as zf:
+            sheet_part = _sheet_part(zf, spec.sheet)
+            sheet_xml = zf.read(sheet_part)
+            if b'<f>' in sheet_xml or b'<f ' in sheet_xml:
+                raise ValueError("la hoja tiene fórmulas")
+            plan = compile_plan(spec, _merged_index(sheet_xml))
+            self._split_sheet(sheet_xml, plan)
+            self._build_zip(zf, data, sheet_part)
+
+    def _split_sheet(self, sheet_xml, plan):
+        """Tramos fijos del XML y, por celda destino, su etiqueta de apertura sin t=..."""
+        # Cada celda se escribe una vez; si dos claves apuntan a la misma
+        # celda gana la última, como al escribir con openpyxl
+        slots = {}
+        for seccion, entradas in enumerate((plan.campos, plan.gastos, plan.resumen)):
+            for clave, row, column in entradas:
+                slots[(row, column)] = (seccion, clave)
+
+        from openpyxl.utils import get_column_letter
+
+        spans = []
+        for (row, column), fuente in slots.items():
+            coordinate = f"{get_column_letter(column)}{row}".encode()
+            match = re.search(rb'<c\b[^>]*?\sr="' + coordinate + rb'"[^>]*?(/?)>', sheet_xml)
+            if match is None:
+                raise ValueError(f"la celda {coordinate.decode()} no existe en la hoja")
+            end = match.end() if match.group(1) else sheet_xml.index(b'</c>', match.end()) + 4
+            opening = _T_ATTRIBUTE.sub(b'', sheet_xml[match.start():match.start(1)])
+            spans.append((match.start(), end, opening.decode(), fuente))
+        spans.sort()
+
+        self._chunks = []
+        self._cells = []
+        position = 0
+        for start, end, opening, fuente in spans:
+            self._chunks.append(sheet_xml[position:start].decode())
+            self._cells.append((opening, fuente))
+            position = end
+        self._chunks.append(sheet_xml[position:].decode())
+
+    def _build_zip(self, zf, data, sheet_part):
+        """Precalcula las entradas locales y centrales de las partes que no cambian"""
+        local = []
+        central = []
+        offset = 0
+        for info in zf.infolist():
+            if info.filename == sheet_part:
+                self._sheet_info = info
+                continue
+            name = info.filename.encode('utf-8')
+            # Datos comprimidos tal como están en la plantilla
+            name_length, extra_length = struct.unpack('<HH', data[info.header_offset + 26:info.header_offset + 30])
+            start = info.header_offset + 30 + name_length + extra_length
+            raw = data[start:start + info.compress_size]
+            dostime, dosdate = _dos_datetime(info)
+            flags = info.flag_bits & 0x0800
+            local.append(_LOCAL_HEADER.pack(0x04034b50, 20, flags, info.compress_type, dostime, dosdate,
+                                            info.CRC, info.compress_size, info.file_size, len(name), 0))
+            local.append(name)
+            local.append(raw)
+            central.append(_CENTRAL_HEADER.pack(0x02014b50, 20, 20, flags, info.compress_type, dostime, dosdate,
+                                                info.CRC, info.compress_size, info.file_size, len(name),
+                                                0, 0, 0, 0, info.external_attr, offset) + name)
+            offset += _LOCAL_HEADER.size + len(name) + len(raw)
+        self._local = b''.join(local)
+        self._central = b''.join(central)
+        self._entries = len(central) + 1
+
+    def render(self, data, totales):
+        """
+        Bytes del .xlsx lleno con el viaje y sus totales (ver TemplatePlan.fill),
+        o None si algún valor no se puede escribir por esta vía (fórmulas,
+        tipos que openpyxl convierte de otra forma, etc.).
+        """
+        gastos = data.get('gastos') or {}
+        parts = [self._chunks[0]]
+        for (opening, (seccion, clave)), chunk in zip(self._cells, self._chunks[1:]):
+            if seccion == 0:
+                valor = data.get(clave, '')
+            elif seccion == 1:
+                valor = gastos.get(clave, 0)
+            else:
+                valor = totales[clave]
+            cell = _cell_xml(opening, valor)
+            if cell is None:
+                return None
+            parts.append(cell)
+            parts.append(chunk)
+        return self._write_zip(''.join(parts).encode('utf-8'))
+
+    def _write_zip(self, sheet_xml):
+        info = self._sheet_info
+        name = info.filename.encode('utf-8')
+        compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+        raw = compressor.compress(sheet_xml) + compressor.flush()
+        crc = zlib.crc32(sheet_xml)
+        dostime, dosdate = _dos_datetime(info)
+        offset = len(self._local)
+        local = _LOCAL_HEADER.pack(0x04034b50, 20, 0, zipfile.ZIP_DEFLATED, dostime, dosdate,
+                                   crc, len(raw), len(sheet_xml), len(name), 0) + name
+        central = self._central + _CENTRAL_HEADER.pack(
+            0x02014b50, 20, 20, 0, zipfile.ZIP_DEFLATED, dostime, dosdate, crc, len(raw), len(sheet_xml),
+            len(name), 0, 0, 0, 0, info.external_attr, offset) + name
+        central_offset = offset + len(local) + len(raw)
+        end = _END_RECORD.pack(0x06054b50, 0, 0, self._entries, self._entries, len(central), central_offset, 0)
+        return b''.join((self._local, local, raw, central, end))
+
+
+def _dos_datetime(info):
+    year, month, day, hour, minute, second = info.date_time
+    return (hour << 11) | (minute << 5) | (second // 2), ((year - 1980) << 9) | (month << 5) | day
+
+
+def _sheet_part(zf, sheet_name):
+    """Ruta dentro del zip de la hoja pedida (o la activa si sheet_name es None)"""
+    workbook = ElementTree.fromstring(zf.read('xl/workbook.xml'))
+    sheets = workbook.findall('main:sheets/main:sheet', _NS)
+    if sheet_name is None:
+        view = workbook.find('main:bookViews/main:workbookView', _NS)
+        sheet = sheets[int(view.get('activeTab', 0)) if view is not None else 0]
+    else:
+        sheet = next((s for s in sheets if s.get('name') == sheet_name), None)
+        if sheet is None:
+            raise ValueError(f"la hoja {sheet_name!r} no existe")
+    rels = ElementTree.fromstring(zf.read('xl/_rels/workbook.xml.rels'))
+    target = next(r.get('Target') for r in rels.findall('rel:Relationship', _NS) if r.get('Id') == sheet.get(_R_ID))
+    return target.lstrip('/') if target.startswith('/') else posixpath.normpath(posixpath.join('xl', target))
+
+
+def _merged_index(sheet_xml):
+    """indice_celdas_fusionadas a partir de los <mergeCell> del XML de la hoja"""
+    from openpyxl.utils import range_boundaries
+
+    return indice_rangos_fusionados(range_boundaries(ref.decode())
+                                    for ref in re.findall(rb'<mergeCell ref="([^"]+)"', sheet_xml))
+
+
+def _escape(texto):
+    return (texto.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+            .replace('\r', '&#13;'))
+
+
+def _cell_xml(opening, valor):
+    """
+    Elemento <c> con el valor, con el mismo tipo que le daría openpyxl; None
+    si el valor necesita openpyxl (fórmulas, caracteres inválidos, tipos no
+    JSON, flotantes no finitos).
+    """
+    if valor is None or valor == '':
+        return opening + '/>'
+    if isinstance(valor, bool):
+        return f'{opening} t="b"><v>{int(valor)}</v></c>'
+    if isinstance(valor, int):
+        return f'{opening}><v>{valor}</v></c>'
+    if isinstance(valor, float):
+        if not math.isfinite(valor):
+            return None
+        return f'{opening}><v>{valor!r}</v></c>'
+    if isinstance(valor, str):
+        if valor.startswith('=') or _ILLEGAL_CHARACTERS.search(valor):
+            return None
+        return f'{opening} t="inlineStr"><is><t xml:space="preserve">{_escape(valor)}</t></is></c>'
+    return None
+
+
+_patchers = {}
+_patchers_lock = threading.Lock()
+
+
+def fast_path_enabled():
+    """La ruta rápida se puede desactivar con XLSX_FAST_PATH=0"""
+    return os.environ.get('XLSX_FAST_PATH', '1') != '0'
+
+
+def get_xlsx_patcher(template=None):
+    """
+    XlsxPatcher (único por proceso) de la plantilla, reconstruido si el
+    archivo cambia en disco; None si la plantilla no admite la ruta rápida.
+    """
+    spec = get_template_spec(template)
+    mtime = os.stat(spec.path).st_mtime_ns
+    cached = _patchers.get(spec.name)
+    if cached is None or cached[0] != mtime:
+        with _patchers_lock:
+            cached = _patchers.get(spec.name)
+            if cached is None or cached[0] != mtime:
+                with stage('template_parse'):
+                    try:
+                        patcher = XlsxPatcher(spec)
+                    except (ValueError, KeyError, StopIteration, zipfile.BadZipFile) as e:
+                        logger.info("Plantilla '%s' sin ruta rápida (se usa openpyxl): %s", spec.name, e)
+                        patcher = None
+                cached = _patchers[spec.name] = (mtime, patcher)
+    return cached[1]
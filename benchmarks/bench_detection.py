@@ -0,0 +1,59 @@
+"""
+Benchmark y verificación de calidad de la detección reducida de documentos.
+
+Para cada foto del set de fixtures compara las esquinas detectadas sobre la
+copia reducida con las detectadas a resolución completa. Termina con código
+de salida 1 si alguna esquina se aleja más de la tolerancia (fracción de la
+diagonal de la imagen).
+
+Uso: python benchmarks/bench_detection.py [max_side] [tolerancia]
+"""
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import cv2
+import numpy as np
+from imutils.perspective import order_points
+from app.service import detect_document_contour, detect_document_contour_scaled
+from fixtures import receipt_photo
+
+FIXTURES = [
+    (4000, 3000, 0, 0), (4000, 3000, 1, 6), (3000, 4000, 2, -4),
+    (3024, 4032, 3, 3), (2448, 3264, 4, -7), (1536, 2048, 5, 2),
+]
+
+
+def medir(func, *args, repeticiones=3):
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        resultado = func(*args)
+    return resultado, (time.perf_counter() - inicio) / repeticiones * 1000
+
+
+if __name__ == '__main__':
+    max_side = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    tolerancia = float(sys.argv[2]) if len(sys.argv) > 2 else 0.01
+    fallos = 0
+
+    print(f"{'imagen':>12} {'completa (ms)':>14} {'reducida (ms)':>14} {'speedup':>8} {'error máx (px)':>15}")
+    for width, height, seed, angle in FIXTURES:
+        image = cv2.imdecode(np.frombuffer(receipt_photo(width, height, seed, angle), np.uint8),
+                             cv2.IMREAD_COLOR)
+        completa, t_completa = medir(detect_document_contour, image)
+        reducida, t_reducida = medir(detect_document_contour_scaled, image, max_side)
+
+        limite = tolerancia * np.hypot(width, height)
+        if completa is None or reducida is None:
+            error = 0.0 if completa is None and reducida is None else float('inf')
+        else:
+            error = np.abs(order_points(completa.reshape(4, 2).astype(np.float32))
+                           - order_points(reducida.reshape(4, 2).astype(np.float32))).max()
+        estado = 'ok' if error <= limite else 'FALLA'
+        fallos += estado != 'ok'
+        print(f"{width:>5}x{height:<6} {t_completa:>14.1f} {t_reducida:>14.1f} "
+              f"{t_completa / t_reducida:>8.1f} {error:>15.1f} {estado}")
+
+    sys.exit(1 if fallos else 0)
@@ -0,0 +1,87 @@
+"""
+Benchmark de generate_exportable_excel: tiempo, pico de memoria (RSS) y
+tamaño del archivo para 10k, 100k y 500k filas. Cada medición corre en un
+subproceso nuevo y las filas se generan de forma perezosa.
+
+Con --legacy se mide también la implementación anterior (Workbook normal en
+memoria, estilos celda por celda) para comparar.
+
+Uso: python benchmarks/bench_exportable_excel.py [--legacy] [filas ...]
+"""
+import io
+import os
+import sys
+import json
+import time
+import subprocess
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(HERE)
+
+from fixtures import ledger_rows
+
+
+def legacy_exportable_excel(exportable_data):
+    """Implementación anterior: Workbook en memoria y estilos por celda"""
+    from openpyxl import Workbook
+    from openpyxl.styles import Border, Side
+    from app.service import EXPORTABLE_DEFAULT_HEADERS
+
+    wb = Workbook()
+    ws = wb.active
+    headers = EXPORTABLE_DEFAULT_HEADERS
+    for col_num, header in enumerate(headers, 1):
+        ws.cell(row=1, column=col_num, value=header)
+    for row_num, row_data in enumerate(exportable_data['data'], 2):
+        for col_num, header in enumerate(headers, 1):
+            border_style = Border(left=Side(style='thin'), right=Side(style='thin'),
+                                  top=Side(style='thin'), bottom=Side(style='thin'))
+            value = row_data.get(header, '')
+            cell = ws.cell(row=row_num, column=col_num, value=value)
+            cell.border = border_style
+            if header in ['Valor', 'Base'] and isinstance(value, (int, float)):
+                cell.number_format = '#,##0.00'
+    buffer = io.BytesIO()
+    wb.save(buffer)
+    buffer.seek(0)
+    return buffer
+
+
+def medir(variante, cantidad):
+    """Corre en el subproceso y reporta tiempo, pico de RSS y tamaño"""
+    import resource
+    sys.path.append(os.path.join(HERE, '..'))
+    from app.service import generate_exportable_excel
+
+    func = legacy_exportable_excel if variante == 'legacy' else generate_exportable_excel
+    inicio = time.perf_counter()
+    salida = func({'data': ledger_rows(cantidad)})
+    duracion = time.perf_counter() - inicio
+    salida.seek(0, os.SEEK_END)
+    print(json.dumps({
+        'variante': variante, 'filas': cantidad, 'segundos': duracion,
+        'pico_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'xlsx_mb': salida.tell() / 1024 / 1024,
+    }))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 3 and sys.argv[1] == '--medir':
+        medir(sys.argv[2], int(sys.argv[3]))
+        sys.exit(0)
+
+    args = sys.argv[1:]
+    variantes = ['write_only']
+    if '--legacy' in args:
+        args.remove('--legacy')
+        variantes.insert(0, 'legacy')
+    cantidades = [int(n) for n in args] or [10_000, 100_000, 500_000]
+
+    print(f"{'variante':>11} {'filas':>8} {'tiempo (s)':>11} {'pico RSS (MB)':>14} {'xlsx (MB)':>10}")
+    for cantidad in cantidades:
+        for variante in variantes:
+            salida = subprocess.run([sys.executable, __file__, '--medir', variante, str(cantidad)],
+                                    capture_output=True, text=True, check=True).stdout
+            r = json.loads(salida.strip().splitlines()[-1])
+            print(f"{r['variante']:>11} {r['filas']:>8} {r['segundos']:>11.1f} "
+                  f"{r['pico_rss_mb']:>14.1f} {r['xlsx_mb']:>10.1f}")
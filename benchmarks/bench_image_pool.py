@@ -0,0 +1,42 @@
+"""
+Benchmark de escalamiento del pool de procesamiento de imágenes de
+generate_invoice_pdf, de 1 a N workers. También verifica que el PDF
+resultante sea idéntico byte a byte para cualquier número de workers.
+
+Uso: python benchmarks/bench_image_pool.py [imagenes] [max_workers]
+     IMAGE_POOL=process python benchmarks/bench_image_pool.py
+"""
+import os
+import sys
+import time
+import hashlib
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from app.service import generate_invoice_pdf
+from fixtures import receipt_photos
+
+# Sin caché de imágenes: cada corrida debe procesar todas las imágenes
+os.environ['IMAGE_CACHE'] = '0'
+
+if __name__ == '__main__':
+    cantidad = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+    max_workers = int(sys.argv[2]) if len(sys.argv) > 2 else (os.cpu_count() or 1)
+    imagenes = receipt_photos(cantidad, 1500, 2000)
+
+    referencia = None
+    base = None
+    workers = 1
+    print(f"{'workers':>8} {'tiempo (s)':>11} {'img/s':>8} {'speedup':>8}  sha256")
+    while workers <= max_workers:
+        os.environ['IMAGE_WORKERS'] = str(workers)
+        generate_invoice_pdf(imagenes[:2])  # calentamiento del pool
+        inicio = time.perf_counter()
+        pdf = generate_invoice_pdf(imagenes).read()
+        duracion = time.perf_counter() - inicio
+        base = base or duracion
+        digest = hashlib.sha256(pdf).hexdigest()[:16]
+        referencia = referencia or digest
+        estado = 'ok' if digest == referencia else 'DIFERENTE'
+        print(f"{workers:>8} {duracion:>11.2f} {cantidad / duracion:>8.1f} {base / duracion:>8.2f}  {digest} {estado}")
+        workers *= 2
@@ -0,0 +1,48 @@
+"""
+Benchmark de diagramación del PDF: páginas por cada 100 facturas y tiempo
+de diagramación, modo 'flow' (filas en orden de llegada) frente a 'shelf'
+(estantes FFDH). Usa JPEGs pequeños con proporciones variadas para que el
+costo medido sea el de la diagramación.
+
+Uso: python benchmarks/bench_layout.py [facturas]
+"""
+import os
+import re
+import sys
+import time
+import random
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import cv2
+import numpy as np
+from app.service import render_invoice_pdf
+
+# (proporción ancho/alto, peso): tirillas largas, facturas carta y fotos horizontales
+PROPORCIONES = [(0.3, 3), (0.45, 3), (0.65, 4), (0.75, 2), (1.4, 1), (1.8, 1)]
+
+
+def factura(aspect_ratio):
+    height = 200
+    width = max(1, int(height * aspect_ratio))
+    ok, buffer = cv2.imencode('.jpg', np.full((height, width, 3), 220, np.uint8))
+    return buffer.tobytes()
+
+
+def paginas(pdf):
+    return int(re.search(rb'/Type /Pages /Kids \[[^\]]*\] /Count (\d+)', pdf.read()).group(1))
+
+
+if __name__ == '__main__':
+    cantidad = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    random.seed(0)
+    proporciones = random.choices([p for p, _ in PROPORCIONES], [w for _, w in PROPORCIONES], k=cantidad)
+    imagenes = [factura(p) for p in proporciones]
+
+    print(f"{'modo':>6} {'páginas':>8} {'pág/100':>8} {'tiempo (ms)':>12}")
+    for layout in ('flow', 'shelf'):
+        inicio = time.perf_counter()
+        pdf = render_invoice_pdf(iter(imagenes), dpi=0, layout=layout)
+        duracion = (time.perf_counter() - inicio) * 1000
+        total = paginas(pdf)
+        print(f"{layout:>6} {total:>8} {total * 100 / cantidad:>8.1f} {duracion:>12.1f}")
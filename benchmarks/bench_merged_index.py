@@ -0,0 +1,55 @@
+"""
+Micro-benchmark de resolución de celdas principales: recorrido lineal de
+merged_cells.ranges frente al índice precalculado (indice_celdas_fusionadas),
+sobre hojas sintéticas con cientos de rangos fusionados.
+
+Uso: python benchmarks/bench_merged_index.py
+"""
+import os
+import sys
+import time
+import random
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from openpyxl import Workbook
+from openpyxl.utils import get_column_letter
+from app.service import obtener_celda_principal
+from app.utils import indice_celdas_fusionadas
+
+
+def hoja_sintetica(num_rangos):
+    """Hoja con num_rangos rangos fusionados de 2x3 celdas, sin solaparse"""
+    ws = Workbook().active
+    por_fila = 10
+    for i in range(num_rangos):
+        fila = (i // por_fila) * 2 + 1
+        col = (i % por_fila) * 3 + 1
+        ws.merge_cells(start_row=fila, start_column=col, end_row=fila + 1, end_column=col + 2)
+    return ws
+
+
+def medir(func, celdas, repeticiones=5):
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        for celda in celdas:
+            func(celda)
+    return (time.perf_counter() - inicio) / (repeticiones * len(celdas)) * 1e6
+
+
+if __name__ == '__main__':
+    random.seed(0)
+    print(f"{'rangos':>8} {'lineal (us/celda)':>18} {'índice (us/celda)':>18} {'construir índice (ms)':>22}")
+    for num_rangos in (50, 200, 500, 1000):
+        ws = hoja_sintetica(num_rangos)
+        max_fila = (num_rangos // 10) * 2 + 2
+        celdas = [ws[f"{get_column_letter(random.randint(1, 30))}{random.randint(1, max_fila)}"]
+                  for _ in range(27)]
+
+        inicio = time.perf_counter()
+        indice = indice_celdas_fusionadas(ws)
+        construir = (time.perf_counter() - inicio) * 1000
+
+        lineal = medir(lambda c: obtener_celda_principal(ws, c), celdas)
+        directo = medir(lambda c: obtener_celda_principal(ws, c, indice), celdas)
+        print(f"{num_rangos:>8} {lineal:>18.2f} {directo:>18.2f} {construir:>22.2f}")
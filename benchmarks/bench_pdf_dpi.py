@@ -0,0 +1,30 @@
+"""
+Benchmark del tamaño del PDF y del tiempo de generación según el DPI
+objetivo de las imágenes embebidas (0 = imágenes sin reducir).
+
+Las imágenes se procesan una sola vez; se mide render_invoice_pdf.
+
+Uso: python benchmarks/bench_pdf_dpi.py [imagenes] [calidad]
+"""
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from app.service import process_images, render_invoice_pdf
+from fixtures import receipt_photos
+
+if __name__ == '__main__':
+    cantidad = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    calidad = int(sys.argv[2]) if len(sys.argv) > 2 else 75
+    procesadas = process_images(receipt_photos(cantidad, 3000, 4000))
+
+    print(f"{'DPI':>5} {'PDF (MB)':>9} {'KB/imagen':>10} {'tiempo (s)':>11}")
+    for dpi in (0, 300, 200, 150, 100, 72):
+        inicio = time.perf_counter()
+        pdf = render_invoice_pdf(iter(procesadas), dpi=dpi, jpeg_quality=calidad)
+        duracion = time.perf_counter() - inicio
+        pdf.seek(0, os.SEEK_END)
+        size = pdf.tell()
+        print(f"{dpi or 'orig':>5} {size / 1024 / 1024:>9.2f} {size / 1024 / cantidad:>10.1f} {duracion:>11.3f}")
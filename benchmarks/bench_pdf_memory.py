@@ -0,0 +1,50 @@
+"""
+Mide el pico de memoria (RSS) de generate_invoice_pdf según el número de
+imágenes. Cada medición corre en un subproceso nuevo para que el pico no
+se contamine entre corridas; las imágenes se generan de forma perezosa.
+
+Uso: python benchmarks/bench_pdf_memory.py [n1 n2 ...]
+"""
+import os
+import sys
+import json
+import time
+import subprocess
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def medir(cantidad):
+    """Corre en el subproceso: genera el PDF y reporta pico de RSS y tamaño"""
+    import resource
+    sys.path.append(os.path.join(HERE, '..'))
+    sys.path.append(HERE)
+    from app.service import generate_invoice_pdf
+    from fixtures import receipt_photo
+
+    imagenes = (receipt_photo(2000, 2600, seed=i % 8, angle=(i % 11) - 5) for i in range(cantidad))
+    inicio = time.perf_counter()
+    pdf = generate_invoice_pdf(imagenes)
+    duracion = time.perf_counter() - inicio
+    pdf.seek(0, os.SEEK_END)
+    print(json.dumps({
+        'imagenes': cantidad,
+        'pico_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'pdf_mb': pdf.tell() / 1024 / 1024,
+        'segundos': duracion,
+    }))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 2 and sys.argv[1] == '--medir':
+        medir(int(sys.argv[2]))
+        sys.exit(0)
+
+    cantidades = [int(n) for n in sys.argv[1:]] or [5, 20, 80]
+    env = dict(os.environ, IMAGE_CACHE='0')
+    print(f"{'imágenes':>9} {'pico RSS (MB)':>14} {'PDF (MB)':>9} {'tiempo (s)':>11}")
+    for cantidad in cantidades:
+        salida = subprocess.run([sys.executable, __file__, '--medir', str(cantidad)],
+                                env=env, capture_output=True, text=True, check=True).stdout
+        r = json.loads(salida.strip().splitlines()[-1])
+        print(f"{r['imagenes']:>9} {r['pico_rss_mb']:>14.1f} {r['pdf_mb']:>9.1f} {r['segundos']:>11.1f}")
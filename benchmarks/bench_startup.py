@@ -0,0 +1,97 @@
+"""
+Mide el arranque en frío por endpoint: tiempo de importar la app (con
+python -X importtime), tiempo hasta la primera respuesta y los módulos
+que más tardaron en importarse. Cada endpoint corre en un intérprete nuevo,
+como en un despliegue serverless.
+
+Uso: python benchmarks/bench_startup.py [--top N]
+"""
+import os
+import sys
+import json
+import time
+import subprocess
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+FILL_PAYLOAD = {'empresa': 'Transportes', 'placa': 'ABC123', 'flete': 1500000, 'anticipo': 800000,
+                'gastos': {'acpm': 350000, 'peajes': 120000}}
+EXPORT_PAYLOAD = {'data': [{'Cuenta': '110505', 'Tipo': 1, 'Valor': 1500.5, 'Detalle': 'Prueba'}]}
+
+# (nombre, método, ruta, payload); la URL de imagen se completa al correr
+ENDPOINTS = [
+    ('fill-invoice', 'POST', '/fill-invoice', FILL_PAYLOAD),
+    ('fill-invoices-batch', 'POST', '/fill-invoices-batch', [FILL_PAYLOAD, FILL_PAYLOAD]),
+    ('generate-invoice-pdf', 'POST', '/generate-invoice-pdf', {'image_urls': ['{image_url}']}),
+    ('exportable xlsx', 'POST', '/generate-exportable-excel', EXPORT_PAYLOAD),
+    ('exportable csv', 'POST', '/generate-exportable-excel', dict(EXPORT_PAYLOAD, format='csv')),
+    ('image-cache/stats', 'GET', '/image-cache/stats', None),
+]
+
+
+def primera_respuesta(metodo, ruta, payload):
+    """Corre en el subproceso: importa la app y atiende una petición"""
+    inicio = time.perf_counter()
+    sys.path.append(os.path.join(HERE, '..'))
+    from app import create_app
+
+    app = create_app()
+    importada = time.perf_counter()
+    respuesta = app.test_client().open(ruta, method=metodo, json=payload)
+    cuerpo = respuesta.get_data()
+    fin = time.perf_counter()
+    print(json.dumps({
+        'status': respuesta.status_code,
+        'bytes': len(cuerpo),
+        'import_ms': (importada - inicio) * 1000,
+        'primera_respuesta_ms': (fin - importada) * 1000,
+        'total_ms': (fin - inicio) * 1000,
+    }))
+
+
+def resumir_importtime(stderr, top):
+    """Suma los tiempos propios de -X importtime y retorna (total ms, módulos más lentos)"""
+    modulos = []
+    for linea in stderr.splitlines():
+        if not linea.startswith('import time:') or 'self [us]' in linea:
+            continue
+        propio, acumulado, nombre = linea[len('import time:'):].split('|')
+        modulos.append((int(acumulado), int(propio), nombre.strip()))
+    total = sum(propio for _, propio, _ in modulos) / 1000
+    # Solo paquetes de primer nivel, para no repetir submódulos
+    raices = sorted((m for m in modulos if '.' not in m[2]), reverse=True)[:top]
+    return total, [(nombre, acumulado / 1000) for acumulado, _, nombre in raices]
+
+
+def servir_imagen():
+    """Sirve una foto sintética por HTTP local para el endpoint de PDF"""
+    sys.path.append(HERE)
+    from fixtures import receipt_photo, serve_images
+
+    server, urls = serve_images([receipt_photo(1200, 1600)])
+    return server, urls[0]
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == '--medir':
+        primera_respuesta(sys.argv[2], sys.argv[3], json.loads(sys.argv[4]))
+        sys.exit(0)
+
+    top = int(sys.argv[sys.argv.index('--top') + 1]) if '--top' in sys.argv else 5
+    server, image_url = servir_imagen()
+    env = dict(os.environ, IMAGE_CACHE='0')
+    try:
+        for nombre, metodo, ruta, payload in ENDPOINTS:
+            payload = json.loads(json.dumps(payload).replace('{image_url}', image_url))
+            proceso = subprocess.run(
+                [sys.executable, '-X', 'importtime', __file__, '--medir', metodo, ruta, json.dumps(payload)],
+                env=env, capture_output=True, text=True, check=True)
+            r = json.loads(proceso.stdout.strip().splitlines()[-1])
+            total_import, lentos = resumir_importtime(proceso.stderr, top)
+            print(f"{nombre} (HTTP {r['status']}, {r['bytes']} bytes)")
+            print(f"  importar app: {r['import_ms']:8.1f} ms   primera respuesta: {r['primera_respuesta_ms']:8.1f} ms"
+                  f"   total: {r['total_ms']:8.1f} ms")
+            print(f"  importtime (todos los módulos): {total_import:8.1f} ms")
+            print("  más lentos: " + ", ".join(f"{m} {ms:.0f} ms" for m, ms in lentos))
+    finally:
+        server.shutdown()
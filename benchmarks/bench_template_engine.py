@@ -0,0 +1,61 @@
+"""
+Benchmark de fill_excel_template: parseo de la plantilla por petición
+(comportamiento anterior) frente a la copia precargada del TemplateEngine.
+El llenado se mide con XLSX_FAST_PATH=0, para que use openpyxl sobre la
+copia del TemplateEngine y no la ruta rápida de xlsx_patch (que se mide en
+bench_xlsx_patch.py).
+
+Uso: python benchmarks/bench_template_engine.py [iteraciones]
+"""
+import io
+import os
+import sys
+import time
+import contextlib
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from openpyxl import load_workbook
+from app.service import fill_excel_template, get_template_path
+
+PAYLOAD = {
+    'empresa': 'INVERCEMENTOS SAS', 'nit': '900.636.114-6', 'placa': 'ABC123',
+    'conductor': 'Conductor Prueba', 'desde': 'Bogotá', 'hasta': 'Medellín',
+    'fecha': '2024-01-15', 'anticipo': 1500000, 'flete': 3000000,
+    'gastos': {'acpm': 800000, 'peajes': 120000, 'cargue': 50000, 'bonificacion': 100000},
+}
+
+
+def fill_sin_cache(data):
+    """Referencia: parsea la plantilla desde disco en cada llamada"""
+    wb = load_workbook(get_template_path())
+    ws = wb.active
+    for celda, valor in (('B7', data['placa']), ('H7', data['conductor']), ('G16', 800000)):
+        ws[celda].value = valor
+    buffer = io.BytesIO()
+    wb.save(buffer)
+    return buffer
+
+
+def fill_template_engine(data):
+    """fill_excel_template sin la ruta rápida: copia precargada + openpyxl"""
+    os.environ['XLSX_FAST_PATH'] = '0'
+    return fill_excel_template(data)
+
+
+def medir(func, iteraciones):
+    with contextlib.redirect_stdout(io.StringIO()):
+        func(PAYLOAD)  # calentamiento
+        inicio = time.perf_counter()
+        for _ in range(iteraciones):
+            func(PAYLOAD)
+        return iteraciones / (time.perf_counter() - inicio)
+
+
+if __name__ == '__main__':
+    iteraciones = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    antes = medir(fill_sin_cache, iteraciones)
+    despues = medir(fill_template_engine, iteraciones)
+    print(f"sin caché (load_workbook por petición): {antes:8.1f} req/s")
+    print(f"TemplateEngine (copia precargada):     {despues:8.1f} req/s")
+    print(f"mejora: x{despues / antes:.2f}")
@@ -0,0 +1,44 @@
+"""
+Latencia de llenado de cada plantilla registrada por las dos vías: openpyxl
+sobre la copia precargada y la ruta rápida de app/xlsx_patch.py. Que ambas
+den el mismo libro se verifica en tests/test_xlsx_patch.py.
+
+Uso: python benchmarks/bench_xlsx_patch.py [iteraciones]
+"""
+import os
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(HERE, '..'))
+sys.path.append(HERE)
+
+from app.service import fill_excel_template, template_names
+from app.xlsx_patch import get_xlsx_patcher
+from fixtures import trip_payload
+
+
+def llenar(payload, template, rapido):
+    os.environ['XLSX_FAST_PATH'] = '1' if rapido else '0'
+    return fill_excel_template(dict(payload), template)
+
+
+def medir(payload, template, rapido, iteraciones):
+    llenar(payload, template, rapido)  # calentamiento
+    inicio = time.perf_counter()
+    for _ in range(iteraciones):
+        llenar(payload, template, rapido)
+    return (time.perf_counter() - inicio) / iteraciones * 1000
+
+
+if __name__ == '__main__':
+    iteraciones = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    for template in template_names():
+        if get_xlsx_patcher(template) is None:
+            print(f"{template}: sin ruta rápida (usa openpyxl)")
+            continue
+        payload = trip_payload(1)
+        lento = medir(payload, template, False, max(1, iteraciones // 10))
+        rapido = medir(payload, template, True, iteraciones)
+        print(f"{template}:")
+        print(f"  openpyxl: {lento:8.3f} ms   ruta rápida: {rapido:8.3f} ms   ({lento / rapido:.0f}x)")
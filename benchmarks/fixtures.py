@@ -0,0 +1,127 @@
+"""
+Fixtures sintéticos compartidos por los benchmarks. Todos son
+deterministas: mismas semillas, mismos bytes.
+"""
+import random
+import threading
+from collections import Counter
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import cv2
+import numpy as np
+
+# Resoluciones de fotos de facturas (ancho, alto): ~2, 5 y 12 megapíxeles
+RECEIPT_RESOLUTIONS = {'2mp': (1200, 1600), '5mp': (2000, 2600), '12mp': (3000, 4000)}
+
+
+def receipt_photo(width=3000, height=4000, seed=0, angle=7, quality=90):
+    """
+    Genera (JPEG en bytes) una foto sintética de una factura: un papel claro
+    con texto simulado, rotado sobre un fondo oscuro con ruido.
+    """
+    rng = np.random.default_rng(seed)
+    image = rng.integers(20, 70, size=(height, width, 3), dtype=np.uint8)
+
+    paper_w, paper_h = int(width * 0.6), int(height * 0.7)
+    paper = np.full((paper_h, paper_w, 3), 235, dtype=np.uint8)
+    line_h = max(8, paper_h // 60)
+    for y in range(line_h * 3, paper_h - line_h * 3, line_h * 2):
+        x_end = int(paper_w * rng.uniform(0.4, 0.9))
+        cv2.rectangle(paper, (paper_w // 10, y), (x_end, y + line_h // 2), (40, 40, 40), -1)
+
+    cx, cy = width / 2, height / 2
+    corners = np.array([[-paper_w / 2, -paper_h / 2], [paper_w / 2, -paper_h / 2],
+                        [paper_w / 2, paper_h / 2], [-paper_w / 2, paper_h / 2]])
+    theta = np.deg2rad(angle)
+    rotation = np.array([[np.cos(theta), -np.sin(theta)], [np.sin(theta), np.cos(theta)]])
+    dst = (corners @ rotation.T + [cx, cy]).astype(np.float32)
+    src = np.array([[0, 0], [paper_w, 0], [paper_w, paper_h], [0, paper_h]], dtype=np.float32)
+    matrix = cv2.getPerspectiveTransform(src, dst)
+    warped = cv2.warpPerspective(paper, matrix, (width, height))
+    mask = cv2.warpPerspective(np.full((paper_h, paper_w), 255, np.uint8), matrix, (width, height))
+    image[mask > 0] = warped[mask > 0]
+
+    ok, buffer = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    return buffer.tobytes()
+
+
+def receipt_photos(count, width=3000, height=4000):
+    """Lista de count fotos sintéticas con semillas y ángulos distintos"""
+    return [receipt_photo(width, height, seed=i, angle=(i % 11) - 5) for i in range(count)]
+
+
+def trip_payload(seed=0):
+    """Payload de /fill-invoice para un viaje, con gastos variados"""
+    rng = random.Random(seed)
+    return {
+        'empresa': 'Transportes de Prueba S.A.S.', 'nit': '900636114-1', 'placa': f'TRK{seed % 1000:03d}',
+        'conductor': 'Conductor de prueba', 'desde': 'Bogotá', 'hasta': 'Medellín', 'fecha': '2024-01-31',
+        'anticipo': rng.randrange(500000, 2000000, 1000), 'flete': rng.randrange(1500000, 4000000, 1000),
+        'gastos': {
+            'acpm': rng.randrange(200000, 900000, 100), 'peajes': rng.randrange(50000, 250000, 100),
+            'cargue': rng.randrange(0, 100000, 100), 'descargue': rng.randrange(0, 100000, 100),
+            'comision_empresa': rng.randrange(0, 150000, 100), 'lavada': 25000, 'parqueadero': 18000,
+            'bonificacion': rng.randrange(0, 200000, 100),
+        },
+    }
+
+
+def ledger_rows(cantidad):
+    """Filas sintéticas del exportable contable (generador perezoso)"""
+    for i in range(cantidad):
+        yield {
+            'Cuenta': 110505 + i % 40, 'Comprobante': 'CE', 'Fecha(mm/dd/yyyy)': '01/31/2024',
+            'Documento': 1000 + i, 'Documento Ref': '', 'Nit': 900636114, 'Detalle': f'Gasto de viaje {i}',
+            'Tipo': 1 + i % 2, 'Valor': 1234.5 + i, 'Base': 0, 'Centro de Costo': 'OPER',
+            'Trans. Ext': '', 'Plazo': 0,
+        }
+
+
+class _ImageHandler(BaseHTTPRequestHandler):
+    images = {}
+    hits = None
+
+    def do_GET(self):
+        with self.hits_lock:
+            self.hits[self.path] += 1
+            attempt = self.hits[self.path]
+        data = self.images.get(self.path)
+        if callable(data):
+            data = data(attempt)
+        if data is None:
+            self.send_error(404)
+            return
+        if isinstance(data, int):
+            self.send_error(data)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'image/jpeg')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+def serve_images(images):
+    """
+    Sirve las imágenes por HTTP local (hilo en segundo plano) para los
+    endpoints que descargan URLs. Retorna (servidor, lista de URLs); el
+    servidor se detiene con server.shutdown().
+
+    Cada imagen puede ser bytes o una función que recibe el número de
+    intento (1, 2, ...) de esa URL y retorna bytes o un código de estado
+    HTTP de error (puede demorarse para simular un servidor lento). Los
+    intentos por ruta quedan en server.hits.
+    """
+    handler = type('Handler', (_ImageHandler,), {
+        'images': {f'/factura_{i}.jpg': data for i, data in enumerate(images)},
+        'hits': Counter(),
+        'hits_lock': threading.Lock(),
+    })
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    server.hits = handler.hits
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    urls = [f'http://127.0.0.1:{server.server_port}{path}' for path in handler.images]
+    return server, urls
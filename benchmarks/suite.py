@@ -0,0 +1,273 @@
+"""
+Suite de benchmarks reproducible de los tres flujos: llenado de la plantilla,
+procesamiento de imágenes / PDF de facturas y exportable contable. Mide las
+funciones directamente y a través del cliente de pruebas de Flask.
+
+Por cada caso reporta percentiles de latencia (p50/p90/p99), throughput,
+pico de memoria (RSS) y tamaño de la salida. Cada caso corre en un
+subproceso nuevo (el pico de RSS no se contamina entre casos) con fixtures
+sintéticos deterministas (ver fixtures.py) y la caché de imágenes apagada.
+Antes de medir se hace una corrida de calentamiento que no se cuenta.
+
+Uso:
+  python benchmarks/suite.py                      corre la suite por defecto
+  python benchmarks/suite.py --full               incluye los casos grandes (100k/500k filas, 12 MP)
+  python benchmarks/suite.py --only pdf exportable  solo casos cuyo nombre contiene alguno de los textos
+  python benchmarks/suite.py --save benchmarks/baseline.json
+  python benchmarks/suite.py --compare benchmarks/baseline.json [--tolerance 0.15]
+
+Con --compare se marca como regresión todo caso cuyo p50, pico de RSS o
+tamaño de salida empeore más que la tolerancia, y el script sale con código 1.
+"""
+import os
+import sys
+import json
+import time
+import platform
+import subprocess
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# nombre: (función que prepara el caso, parámetros, repeticiones, solo con --full)
+CASES = {}
+
+
+def caso(nombre, repeticiones, full=False, **params):
+    def registrar(preparar):
+        CASES[nombre] = (preparar, params, repeticiones, full)
+        return preparar
+    return registrar
+
+
+# Cada función de preparación construye los fixtures (fuera de la medición)
+# y retorna (función a medir, ítems procesados por llamada). La función a
+# medir retorna la salida, para reportar su tamaño.
+
+def _client():
+    from app import create_app
+    return create_app().test_client()
+
+
+def _respuesta(response):
+    if response.status_code != 200:
+        raise RuntimeError(f"HTTP {response.status_code}: {response.get_data(as_text=True)[:200]}")
+    return response.get_data()
+
+
+@caso('fill_excel_template', 100)
+def _fill_directo():
+    from app.service import fill_excel_template
+    from fixtures import trip_payload
+
+    payloads = iter([trip_payload(i) for i in range(100)] * 10)
+    return lambda: fill_excel_template(next(payloads)), 1
+
+
+@caso('fill_invoice_http', 100)
+def _fill_http():
+    from fixtures import trip_payload
+
+    client = _client()
+    payloads = iter([trip_payload(i) for i in range(100)] * 10)
+    return lambda: _respuesta(client.post('/fill-invoice', json=next(payloads))), 1
+
+
+for _resolucion, _repeticiones, _full in (('2mp', 10, False), ('5mp', 5, False), ('12mp', 3, True)):
+    @caso(f'process_image_{_resolucion}', _repeticiones, _full, resolucion=_resolucion)
+    def _process_image(resolucion):
+        from app.service import process_image
+        from fixtures import receipt_photo, RECEIPT_RESOLUTIONS
+
+        foto = receipt_photo(*RECEIPT_RESOLUTIONS[resolucion])
+        return lambda: process_image(foto), 1
+
+
+for _resolucion, _full in (('5mp', False), ('12mp', True)):
+    @caso(f'generate_invoice_pdf_10x{_resolucion}', 3, _full, resolucion=_resolucion, cantidad=10)
+    def _pdf_directo(resolucion, cantidad):
+        from app.service import generate_invoice_pdf
+        from fixtures import receipt_photo, RECEIPT_RESOLUTIONS
+
+        fotos = [receipt_photo(*RECEIPT_RESOLUTIONS[resolucion], seed=i, angle=(i % 11) - 5)
+                 for i in range(cantidad)]
+        return lambda: generate_invoice_pdf(fotos), cantidad
+
+
+@caso('generate_invoice_pdf_http_10x2mp', 3, resolucion='2mp', cantidad=10)
+def _pdf_http(resolucion, cantidad):
+    from fixtures import receipt_photo, serve_images, RECEIPT_RESOLUTIONS
+
+    fotos = [receipt_photo(*RECEIPT_RESOLUTIONS[resolucion], seed=i, angle=(i % 11) - 5)
+             for i in range(cantidad)]
+    _, urls = serve_images(fotos)
+    client = _client()
+    return lambda: _respuesta(client.post('/generate-invoice-pdf', json={'image_urls': urls})), cantidad
+
+
+for _filas, _repeticiones, _full in ((1000, 10, False), (10000, 3, False), (100000, 1, True), (500000, 1, True)):
+    @caso(f'exportable_excel_{_filas // 1000}k', _repeticiones, _full, filas=_filas)
+    def _exportable_directo(filas):
+        from app.service import generate_exportable_excel
+        from fixtures import ledger_rows
+
+        # Filas generadas de forma perezosa, como llegan por NDJSON
+        return lambda: generate_exportable_excel({'data': ledger_rows(filas)}), filas
+
+
+@caso('exportable_excel_http_10k', 3, filas=10000)
+def _exportable_http(filas):
+    from fixtures import ledger_rows
+
+    client = _client()
+    payload = {'data': list(ledger_rows(filas))}
+    return lambda: _respuesta(client.post('/generate-exportable-excel', json=payload)), filas
+
+
+def _tamano(salida):
+    """Tamaño en bytes de la salida (bytes, BytesIO o archivo temporal)"""
+    if isinstance(salida, (bytes, bytearray)):
+        return len(salida)
+    salida.seek(0, os.SEEK_END)
+    tamano = salida.tell()
+    salida.close()
+    return tamano
+
+
+def percentil(valores, p):
+    """Percentil p (0-100) con interpolación lineal entre los valores ordenados"""
+    ordenados = sorted(valores)
+    posicion = (len(ordenados) - 1) * p / 100
+    abajo = int(posicion)
+    arriba = min(abajo + 1, len(ordenados) - 1)
+    return ordenados[abajo] + (ordenados[arriba] - ordenados[abajo]) * (posicion - abajo)
+
+
+def correr_caso(nombre):
+    """Corre en el subproceso: prepara, calienta y mide un caso; imprime JSON"""
+    import resource
+    sys.path.append(os.path.join(HERE, '..'))
+    sys.path.append(HERE)
+
+    preparar, params, repeticiones, _ = CASES[nombre]
+    funcion, items = preparar(**params)
+    _tamano(funcion())  # calentamiento: imports, plantilla, pools
+    rss_inicial = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    latencias = []
+    tamano = 0
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        salida = funcion()
+        latencias.append(time.perf_counter() - inicio)
+        tamano = _tamano(salida)
+        del salida
+
+    total = sum(latencias)
+    print(json.dumps({
+        'repeticiones': repeticiones,
+        'p50_ms': percentil(latencias, 50) * 1000,
+        'p90_ms': percentil(latencias, 90) * 1000,
+        'p99_ms': percentil(latencias, 99) * 1000,
+        'media_ms': total / repeticiones * 1000,
+        'ops_s': repeticiones / total,
+        'items_s': repeticiones * items / total,
+        'rss_inicial_mb': rss_inicial,
+        'pico_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'salida_bytes': tamano,
+    }))
+
+
+def correr_suite(nombres):
+    env = dict(os.environ, IMAGE_CACHE='0')
+    resultados = {}
+    for nombre in nombres:
+        proceso = subprocess.run([sys.executable, __file__, '--case', nombre],
+                                 env=env, capture_output=True, text=True)
+        if proceso.returncode != 0:
+            print(f"{nombre}: falló\n{proceso.stderr[-2000:]}", file=sys.stderr)
+            continue
+        resultados[nombre] = r = json.loads(proceso.stdout.strip().splitlines()[-1])
+        print(f"{nombre:<36} {r['p50_ms']:>10.1f} {r['p90_ms']:>10.1f} {r['p99_ms']:>10.1f} "
+              f"{r['items_s']:>12.1f} {r['pico_rss_mb']:>10.1f} {r['salida_bytes'] / 1024:>11.1f}", flush=True)
+    return resultados
+
+
+# Métricas comparadas con la línea base: (clave, etiqueta); en todas, más es peor
+COMPARADAS = (('p50_ms', 'p50'), ('pico_rss_mb', 'RSS'), ('salida_bytes', 'salida'))
+
+
+def comparar(resultados, base, tolerancia):
+    """Imprime el cambio relativo contra la línea base; retorna las regresiones"""
+    regresiones = []
+    print(f"\nComparación con la línea base (tolerancia {tolerancia:.0%}):")
+    for nombre, r in resultados.items():
+        anterior = base.get('casos', {}).get(nombre)
+        if anterior is None:
+            print(f"  {nombre:<36} (sin línea base)")
+            continue
+        partes = []
+        for clave, etiqueta in COMPARADAS:
+            if not anterior.get(clave):
+                continue
+            cambio = r[clave] / anterior[clave] - 1
+            marca = ''
+            if cambio > tolerancia:
+                marca = ' REGRESIÓN'
+                regresiones.append((nombre, etiqueta, cambio))
+            elif cambio < -tolerancia:
+                marca = ' mejora'
+            partes.append(f"{etiqueta} {cambio:+.1%}{marca}")
+        print(f"  {nombre:<36} " + ", ".join(partes))
+    return regresiones
+
+
+def _argumento(nombre, defecto=None):
+    return sys.argv[sys.argv.index(nombre) + 1] if nombre in sys.argv else defecto
+
+
+def _filtros():
+    if '--only' not in sys.argv:
+        return []
+    filtros = []
+    for arg in sys.argv[sys.argv.index('--only') + 1:]:
+        if arg.startswith('--'):
+            break
+        filtros.append(arg)
+    return filtros
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 2 and sys.argv[1] == '--case':
+        correr_caso(sys.argv[2])
+        sys.exit(0)
+
+    full = '--full' in sys.argv
+    filtros = _filtros()
+    nombres = [nombre for nombre, (_, _, _, solo_full) in CASES.items()
+               if (full or not solo_full) and (not filtros or any(f in nombre for f in filtros))]
+
+    print(f"{'caso':<36} {'p50 (ms)':>10} {'p90 (ms)':>10} {'p99 (ms)':>10} "
+          f"{'ítems/s':>12} {'RSS (MB)':>10} {'salida (KB)':>11}")
+    resultados = correr_suite(nombres)
+
+    guardar = _argumento('--save')
+    if guardar:
+        with open(guardar, 'w') as f:
+            json.dump({
+                'meta': {
+                    'fecha': time.strftime('%Y-%m-%d %H:%M:%S'),
+                    'python': platform.python_version(),
+                    'plataforma': platform.platform(),
+                    'cpus': os.cpu_count(),
+                },
+                'casos': resultados,
+            }, f, indent=2, ensure_ascii=False)
+        print(f"\nLínea base guardada en {guardar}")
+
+    base_path = _argumento('--compare')
+    if base_path:
+        with open(base_path) as f:
+            base = json.load(f)
+        regresiones = comparar(resultados, base, float(_argumento('--tolerance', 0.15)))
+        if regresiones:
+            sys.exit(1)
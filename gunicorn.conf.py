@@ -0,0 +1,15 @@
+# Configuración de gunicorn (se carga automáticamente desde el directorio de trabajo)
+import gc
+
+# Cargar la app en el proceso maestro para que los workers compartan su memoria
+preload_app = True
+
+
+def pre_fork(server, worker):
+    """Precalienta el estado compartido una sola vez, antes de crear los workers"""
+    from app.state import warm_up, warm_up_enabled
+
+    if warm_up_enabled():
+        warm_up()
+    # Evita que el GC de los workers toque (y copie) los objetos heredados
+    gc.freeze()
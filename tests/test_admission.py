@@ -0,0 +1,82 @@
+"""Límites por petición y cupos de procesamiento (app/admission.py)"""
+import io
+import warnings
+
+import pytest
+from PIL import Image
+
+from app.admission import LimitExceeded
+from app.image_io import image_pixels
+from fixtures import serve_images
+
+
+def png(width, height):
+    buffer = io.BytesIO()
+    Image.new('1', (width, height)).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+@pytest.fixture(autouse=True)
+def _sin_avisos_de_bomba():
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', Image.DecompressionBombWarning)
+        yield
+
+
+def test_image_pixels_reads_header():
+    assert image_pixels(png(120, 80)) == 9600
+    assert image_pixels(b'no es una imagen') == 0
+
+
+@pytest.mark.parametrize('size', [(10000, 10000), (20000, 10000)])
+def test_image_pixels_rejects_decompression_bombs(size):
+    # Entre MAX_IMAGE_PIXELS y el doble PIL avisa; por encima lanza DecompressionBombError
+    with pytest.raises(LimitExceeded) as error:
+        image_pixels(png(*size))
+    assert error.value.status == 413
+
+
+def test_invoice_pdf_answers_413_for_a_bomb(client, monkeypatch):
+    monkeypatch.setenv('IMAGE_CACHE', '0')
+    server, urls = serve_images([png(20000, 10000)])
+    try:
+        response = client.post('/generate-invoice-pdf', json={'image_urls': urls})
+    finally:
+        server.shutdown()
+    assert response.status_code == 413
+    assert 'píxeles' in response.get_json()['error']
+
+
+@pytest.fixture
+def controller(tmp_path):
+    from app.admission import AdmissionController, AdmissionLimits
+
+    return AdmissionController(1, 1, 0.2, AdmissionLimits.from_env(), directory=str(tmp_path))
+
+
+def test_stats_do_not_take_the_slot_locks(controller, monkeypatch):
+    from app import admission
+
+    with controller.admit(1):
+        def flock(*args):
+            raise AssertionError("las estadísticas no deben tomar bloqueos")
+
+        monkeypatch.setattr(admission.fcntl, 'flock', flock)
+        stats = controller.stats()
+        monkeypatch.undo()
+        assert (stats['in_use'], stats['waiting']) == (1, 0)
+    assert controller.stats()['in_use'] == 0
+
+
+def test_killed_holder_frees_its_slot(controller):
+    import os
+    import signal
+
+    pid = os.fork()
+    if pid == 0:
+        controller.admit(1).__enter__()
+        os.kill(os.getpid(), signal.SIGKILL)
+    os.waitpid(pid, 0)
+    assert controller.stats()['in_use'] == 0
+    with controller.admit(1):
+        assert controller.stats()['in_use'] == 1
@@ -0,0 +1,90 @@
+"""Descargas (app/downloader.py) contra el servidor HTTP local de los fixtures"""
+import time
+from urllib.parse import urlparse
+
+import pytest
+
+from app import downloader
+from app.admission import AdmissionController, AdmissionLimits, LimitExceeded
+from app.downloader import DownloadError, fetch, iter_downloads
+from fixtures import serve_images
+
+
+@pytest.fixture(autouse=True)
+def session(monkeypatch):
+    """Sesión nueva por prueba, con reintentos sin espera entre intentos"""
+    monkeypatch.setenv('DOWNLOAD_RETRIES', '2')
+    monkeypatch.setenv('DOWNLOAD_BACKOFF', '0')
+    monkeypatch.setattr(downloader, '_session', None)
+
+
+@pytest.fixture
+def servir():
+    servers = []
+
+    def servir(*images):
+        server, urls = serve_images(list(images))
+        servers.append(server)
+        return server, urls
+
+    yield servir
+    for server in servers:
+        server.shutdown()
+
+
+def intentos(server, url):
+    return server.hits[urlparse(url).path]
+
+
+def test_retries_5xx_until_success(servir):
+    server, [url] = servir(lambda intento: 503 if intento < 3 else b'imagen')
+    assert fetch(url) == b'imagen'
+    assert intentos(server, url) == 3
+
+
+def test_gives_up_after_the_configured_retries(servir):
+    server, [url] = servir(lambda intento: 502)
+    with pytest.raises(DownloadError) as error:
+        fetch(url)
+    assert error.value.url == url
+    assert intentos(server, url) == 3
+
+
+def test_does_not_retry_4xx(servir):
+    server, [url] = servir(lambda intento: 404)
+    with pytest.raises(DownloadError):
+        fetch(url)
+    assert intentos(server, url) == 1
+
+
+def test_per_request_timeout(servir, monkeypatch):
+    monkeypatch.setenv('DOWNLOAD_READ_TIMEOUT', '0.2')
+    monkeypatch.setenv('DOWNLOAD_RETRIES', '0')
+
+    def lento(intento):
+        time.sleep(2)
+        return b'tarde'
+
+    server, [url] = servir(lento)
+    inicio = time.monotonic()
+    with pytest.raises(DownloadError) as error:
+        fetch(url)
+    assert time.monotonic() - inicio < 1.5
+    assert 'timed out' in str(error.value).lower()
+
+
+def test_byte_limit_stops_the_download(servir, tmp_path):
+    limits = AdmissionLimits(max_images=0, max_bytes=100_000, max_pixels=0, max_seconds=0, job_max_seconds=0)
+    controller = AdmissionController(1, 0, 1, limits, directory=str(tmp_path))
+    server, urls = servir(b'x' * 60_000, b'y' * 60_000)
+    with controller.admit(len(urls)) as budget:
+        with pytest.raises(LimitExceeded) as error:
+            for _ in iter_downloads(urls, concurrency=1):
+                pass
+    assert error.value.status == 413
+    assert budget.bytes <= 100_000 + 64 * 1024
+
+
+def test_downloads_keep_their_index(servir):
+    server, urls = servir(*[bytes([i]) * 10 for i in range(5)])
+    assert sorted(iter_downloads(urls, concurrency=3)) == [(i, bytes([i]) * 10) for i in range(5)]
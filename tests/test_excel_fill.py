@@ -0,0 +1,28 @@
+"""Llenado de la plantilla por lotes (fill_excel_templates_zip) por /fill-invoices-batch"""
+import io
+import json
+import zipfile
+
+from app import excel_fill
+from fixtures import trip_payload
+
+
+def test_batch_zip_has_one_book_per_trip_and_errors(client):
+    viajes = [trip_payload(i) for i in range(5)]
+    viajes[2] = dict(viajes[2], flete='no es un monto')
+    with client.post('/fill-invoices-batch', json=viajes) as response:
+        assert response.status_code == 200
+        contenido = response.get_data()
+    with zipfile.ZipFile(io.BytesIO(contenido)) as zf:
+        nombres = zf.namelist()
+        errores = json.loads(zf.read('errores.json'))
+    assert nombres == [f"gastos_viaje_{i:04d}.xlsx" for i in (1, 2, 4, 5)] + ['errores.json']
+    assert [error['indice'] for error in errores] == [3]
+
+
+def test_batch_zip_streams_in_bounded_chunks(monkeypatch):
+    monkeypatch.setattr(excel_fill, '_ZIP_CHUNK_BYTES', 1)
+    partes = list(excel_fill.fill_excel_templates_zip([trip_payload(i) for i in range(3)]))
+    # Una parte por libro y el cierre del ZIP
+    assert len(partes) == 4
+    assert all(partes)
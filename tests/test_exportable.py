@@ -0,0 +1,83 @@
+"""Exportable contable en sus formatos (app/exportable.py) por /generate-exportable-excel"""
+import io
+
+import pytest
+
+FILAS = [
+    {'Cuenta': '1105', 'Tipo': 1, 'Valor': '1234.5', 'Base': ' 10 '},
+    {'Cuenta': '2205', 'Tipo': 'D', 'Valor': 5},
+    {'Cuenta': '2408', 'Tipo': 2.0, 'Valor': None, 'Base': 0.125},
+]
+
+
+def leer(fmt, data):
+    pa = pytest.importorskip('pyarrow')
+    import pyarrow.parquet as pq
+
+    if fmt == 'parquet':
+        return pq.read_table(io.BytesIO(data))
+    return pa.ipc.open_file(io.BytesIO(data)).read_all()
+
+
+@pytest.mark.parametrize('fmt', ['xlsx', 'csv', 'parquet', 'arrow'])
+def test_all_formats_accept_the_same_rows(client, fmt):
+    if fmt in ('parquet', 'arrow'):
+        pytest.importorskip('pyarrow')
+    with client.post('/generate-exportable-excel', json={'data': FILAS, 'format': fmt}) as response:
+        assert response.status_code == 200, response.get_data()
+
+
+@pytest.mark.parametrize('fmt', ['parquet', 'arrow'])
+def test_columnar_types(client, fmt):
+    pa = pytest.importorskip('pyarrow')
+    response = client.post('/generate-exportable-excel', json={'data': FILAS, 'format': fmt})
+    tabla = leer(fmt, response.get_data())
+    assert tabla.schema.field('Tipo').type == pa.string()
+    assert tabla.schema.field('Valor').type == pa.float64()
+    assert tabla.column('Tipo').to_pylist() == ['1', 'D', '2']
+    assert tabla.column('Valor').to_pylist() == [1234.5, 5.0, None]
+    assert tabla.column('Base').to_pylist() == [10.0, None, 0.12]
+
+
+@pytest.mark.parametrize('fila, mensaje', [
+    ({'Tipo': 1.7}, "no entero"),
+    ({'Valor': 'abc'}, "no numérico"),
+    ({'Base': 'nan'}, "no numérico"),
+])
+def test_columnar_rejects_invalid_values(client, fila, mensaje):
+    pytest.importorskip('pyarrow')
+    response = client.post('/generate-exportable-excel', json={'data': [fila], 'format': 'parquet'})
+    assert response.status_code == 400
+    assert mensaje in response.get_json()['error']
+
+
+@pytest.mark.parametrize('ruta', ['/generate-exportable-excel', '/jobs/exportable'])
+@pytest.mark.parametrize('campo, valor', [('filename', 123), ('format', ['csv']), ('format', {'a': 1})])
+def test_non_string_options_are_client_errors(client, ruta, campo, valor):
+    response = client.post(ruta, json={'data': FILAS, campo: valor})
+    assert response.status_code == 400
+    assert f"'{campo}'" in response.get_json()['error']
+
+
+def test_non_string_options_in_ndjson(client):
+    body = b'{"options": {"filename": 5}}\n{"Cuenta": 1}\n'
+    response = client.post('/generate-exportable-excel', data=body,
+                           headers={'Content-Type': 'application/x-ndjson'})
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize('spool', ['1', str(4 * 1024 * 1024)])
+def test_ndjson_csv_validates_every_row_before_streaming(client, monkeypatch, spool):
+    # Con un spool de 1 byte las filas pasan a disco antes de responder
+    monkeypatch.setenv('EXPORT_SPOOL_MAX_BYTES', spool)
+    filas = b''.join(b'{"Cuenta": %d}\n' % i for i in range(3000))
+    headers = {'Content-Type': 'application/x-ndjson'}
+
+    body = b'{"options": {"format": "csv"}}\n' + filas
+    with client.post('/generate-exportable-excel', data=body, headers=headers) as response:
+        assert response.status_code == 200
+        assert response.get_data().count(b'\r\n') == 3001
+
+    with client.post('/generate-exportable-excel', data=body + b'[1]\n', headers=headers) as response:
+        assert response.status_code == 400
+        assert 'Línea 3002' in response.get_json()['error']
@@ -0,0 +1,123 @@
+"""Cola de trabajos (app/jobs.py) a través de las rutas /jobs/*, con una cola en proceso"""
+import os
+import time
+import threading
+
+import pytest
+
+from app import jobs
+from app.jobs import JobQueue, DONE, FAILED
+from fixtures import ledger_rows
+
+TTL = 30
+
+
+@pytest.fixture
+def queue(tmp_path, monkeypatch):
+    """Cola de un worker y dos cupos sobre un spool temporal, en lugar de la del proceso"""
+    queue = JobQueue(str(tmp_path), workers=1, max_pending=2, ttl=TTL)
+    monkeypatch.setattr(jobs, '_queue', queue)
+    return queue
+
+
+def esperar(client, job_id, timeout=30):
+    """Consulta /jobs/<id> hasta que el trabajo termine; retorna su estado"""
+    limite = time.monotonic() + timeout
+    while time.monotonic() < limite:
+        job = client.get(f'/jobs/{job_id}').get_json()
+        if job['status'] in (DONE, FAILED):
+            return job
+        time.sleep(0.01)
+    raise TimeoutError(f"el trabajo {job_id} no terminó en {timeout}s")
+
+
+def bloquear(queue):
+    """Ocupa todos los cupos con trabajos que esperan el evento retornado"""
+    gate = threading.Event()
+
+    def bloqueado():
+        gate.wait()
+        return iter([b'ok'])
+
+    return gate, [queue.submit('bloqueo', bloqueado, (), 'bloqueo.txt', 'text/plain')
+                  for _ in range(queue.max_pending)]
+
+
+def test_exportable_job_matches_sync_download(client, queue):
+    payload = {'data': list(ledger_rows(500)), 'format': 'csv', 'filename': 'libro año'}
+    response = client.post('/jobs/exportable', json=payload)
+    assert response.status_code == 202
+    body = response.get_json()
+    assert response.headers['Location'] == body['status_url']
+
+    job = esperar(client, body['job_id'])
+    assert job['status'] == DONE, job.get('error')
+    assert os.path.exists(queue.result_path(body['job_id']))
+
+    with client.get(body['download_url']) as download, \
+            client.post('/generate-exportable-excel', json=payload) as directo:
+        assert download.status_code == 200
+        assert download.headers['Content-Type'] == 'text/csv; charset=utf-8'
+        assert download.headers['Content-Disposition'] == directo.headers['Content-Disposition']
+        assert download.get_data() == directo.get_data()
+
+
+def test_full_queue_answers_429(client, queue):
+    gate, bloqueados = bloquear(queue)
+    try:
+        response = client.post('/jobs/exportable', json={'data': list(ledger_rows(5))})
+        assert response.status_code == 429
+        assert response.headers['Retry-After'] == '5'
+        assert queue.stats()['pending'] == queue.max_pending
+
+        response = client.get(f"/jobs/{bloqueados[0]['job_id']}/download")
+        assert response.status_code == 409
+    finally:
+        gate.set()
+
+
+def test_slot_is_free_once_done_is_visible(client, queue):
+    gate, bloqueados = bloquear(queue)
+    gate.set()
+    for job in bloqueados:
+        assert esperar(client, job['job_id'])['status'] == DONE
+    # Visto 'done', el cupo ya está libre: se puede volver a encolar de inmediato
+    assert queue.stats()['pending'] == 0
+    response = client.post('/jobs/exportable', json={'data': list(ledger_rows(5))})
+    assert response.status_code == 202
+    esperar(client, response.get_json()['job_id'])
+
+
+def test_failed_job_reports_error_and_frees_slot(client, queue):
+    def falla():
+        raise ValueError("sin datos")
+
+    job = queue.submit('falla', falla, (), 'x.csv', 'text/csv')
+    estado = esperar(client, job['job_id'])
+    assert estado['status'] == FAILED
+    assert estado['error'] == "sin datos"
+    assert queue.stats()['pending'] == 0
+    assert client.get(f"/jobs/{job['job_id']}/download").status_code == 409
+
+
+def test_expired_jobs_are_purged(client, queue):
+    vencido = client.post('/jobs/exportable', json={'data': list(ledger_rows(5))}).get_json()['job_id']
+    vigente = client.post('/jobs/exportable', json={'data': list(ledger_rows(5))}).get_json()['job_id']
+    esperar(client, vencido)
+    esperar(client, vigente)
+
+    antes = time.time() - TTL - 1
+    for name in os.listdir(queue.directory):
+        if name.startswith(vencido):
+            os.utime(os.path.join(queue.directory, name), (antes, antes))
+    queue.purge_expired(force=True)
+
+    assert not any(name.startswith(vencido) for name in os.listdir(queue.directory))
+    assert client.get(f'/jobs/{vencido}').status_code == 404
+    assert client.get(f'/jobs/{vencido}/download').status_code == 404
+    assert client.get(f'/jobs/{vigente}').get_json()['status'] == DONE
+
+
+def test_unknown_job_id(client, queue):
+    assert client.get('/jobs/no-es-un-id').status_code == 404
+    assert client.get('/jobs/' + '0' * 32).status_code == 404
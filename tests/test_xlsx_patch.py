@@ -0,0 +1,58 @@
+"""Ruta rápida de llenado (app/xlsx_patch.py) frente a openpyxl"""
+import zipfile
+
+import pytest
+from openpyxl import load_workbook
+
+from app.service import fill_excel_template, template_names, get_template_spec, load_template
+from app.utils import indice_celdas_fusionadas
+from app.xlsx_patch import get_xlsx_patcher, _merged_index, _sheet_part
+from fixtures import trip_payload
+
+# Casos borde: textos con caracteres especiales, vacíos, flotantes, bool,
+# montos en texto, gastos ausentes, campos faltantes
+CASOS = [trip_payload(i) for i in range(20)] + [
+    {'empresa': 'A & B <S.A.S.> "Comillas" \'simples\'', 'nit': '  espacios  ', 'placa': 'ÑANDÚ-123',
+     'conductor': 'Línea 1\nLínea 2', 'desde': '', 'hasta': None, 'fecha': '2024-02-29',
+     'anticipo': 1500000.25, 'flete': '3000000.10', 'gastos': {'acpm': 0.1, 'peajes': 0.2, 'otros': '15000'}},
+    {'placa': 'XYZ999', 'flete': 0, 'anticipo': 0, 'gastos': None},
+    {'empresa': True, 'nit': 123456789, 'placa': 1.5, 'flete': 10 ** 12, 'anticipo': -5000,
+     'gastos': {'bonificacion': 250000.5, 'llantas': '', 'lavada': None}},
+    {},
+]
+
+PLANTILLAS = [name for name in template_names() if get_xlsx_patcher(name) is not None]
+
+
+def valores(buffer):
+    """
+    {hoja: {coordenada: valor}} de las celdas con valor. Las vacías no
+    cuentan: la plantilla declara celdas vacías (y textos '') que openpyxl
+    descarta al guardar.
+    """
+    wb = load_workbook(buffer)
+    return {ws.title: {cell.coordinate: cell.value for row in ws.iter_rows() for cell in row
+                       if cell.value not in (None, '')}
+            for ws in wb.worksheets}
+
+
+def llenar(monkeypatch, payload, template, rapido):
+    monkeypatch.setenv('XLSX_FAST_PATH', '1' if rapido else '0')
+    return fill_excel_template(dict(payload), template)
+
+
+@pytest.mark.parametrize('template', PLANTILLAS)
+@pytest.mark.parametrize('numero', range(len(CASOS)))
+def test_fast_path_matches_openpyxl(monkeypatch, template, numero):
+    payload = CASOS[numero]
+    assert valores(llenar(monkeypatch, payload, template, True)) == \
+        valores(llenar(monkeypatch, payload, template, False))
+
+
+@pytest.mark.parametrize('template', template_names())
+def test_merged_index_matches_openpyxl(template):
+    spec = get_template_spec(template)
+    _, ws, _ = load_template(template)
+    with zipfile.ZipFile(spec.path) as zf:
+        sheet_xml = zf.read(_sheet_part(zf, spec.sheet))
+    assert _merged_index(sheet_xml) == indice_celdas_fusionadas(ws)